@@ -1,6 +1,7 @@
 import streamlit as st
 from common.ui_style import apply_custom_style
 from st_pages import get_nav_from_toml
+from common.http_api import start_api_server
 
 st.set_page_config(
     page_title="数据预处理-工具集",
@@ -17,4 +18,7 @@ pg = st.navigation(nav, position="top")
 
 apply_custom_style()
 
+# 后台启动HTTP任务接口（只在首次运行时启动）
+start_api_server()
+
 pg.run()
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""PDF快速路径基准测试：对比各转换模式的吞吐量和输出保真度
+
+用法：python -m benchmarks.pdf_fast_path <PDF目录> [--repeat N]
+
+以完整版面分析（full）的输出为基准，统计auto/fast模式的页/秒、
+走快速路径的页数占比，以及与基准输出的文本相似度（0~1）。
+"""
+import argparse
+import difflib
+import time
+from pathlib import Path
+
+from common.pdf_converter import CONVERT_MODES, convert_pdf_to_markdown, is_simple_text_page, open_pdf
+
+
+def similarity(reference, text):
+    """忽略空白差异后的文本相似度"""
+    return difflib.SequenceMatcher(None, " ".join(reference.split()), " ".join(text.split()), autojunk=False).ratio()
+
+
+def benchmark_file(pdf_path, repeat=1):
+    content = pdf_path.read_bytes()
+    with open_pdf(content) as doc:
+        page_count = doc.page_count
+        simple_pages = sum(is_simple_text_page(page) for page in doc)
+    
+    row = {'file': pdf_path.name, 'pages': page_count, 'simple_pages': simple_pages}
+    outputs = {}
+    for mode in CONVERT_MODES:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            outputs[mode] = convert_pdf_to_markdown(content, mode=mode)
+        row[f'{mode}_seconds'] = (time.perf_counter() - start) / repeat
+    for mode in ('auto', 'fast'):
+        row[f'{mode}_similarity'] = similarity(outputs['full'], outputs[mode])
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF快速路径基准测试")
+    parser.add_argument("pdf_dir", help="包含PDF文件的目录（建议混合纯文本报告、表格、扫描件等）")
+    parser.add_argument("--repeat", type=int, default=1, help="每个文件每种模式重复次数")
+    args = parser.parse_args()
+    
+    rows = [benchmark_file(path, args.repeat) for path in sorted(Path(args.pdf_dir).glob("*.pdf"))]
+    if not rows:
+        print("目录中没有PDF文件")
+        return
+    
+    print(f"{'文件':<32}{'页数':>6}{'快速页':>8}{'full秒':>9}{'auto秒':>9}{'fast秒':>9}{'auto相似':>10}{'fast相似':>10}")
+    for row in rows:
+        print(f"{row['file'][:30]:<32}{row['pages']:>6}{row['simple_pages']:>8}"
+              f"{row['full_seconds']:>9.2f}{row['auto_seconds']:>9.2f}{row['fast_seconds']:>9.2f}"
+              f"{row['auto_similarity']:>10.3f}{row['fast_similarity']:>10.3f}")
+    
+    total_pages = sum(row['pages'] for row in rows)
+    print("-" * 93)
+    for mode in CONVERT_MODES:
+        seconds = sum(row[f'{mode}_seconds'] for row in rows)
+        line = f"{mode:<6} 吞吐量 {total_pages / seconds:8.1f} 页/秒"
+        if mode != 'full':
+            # 按页数加权的平均相似度
+            fidelity = sum(row[f'{mode}_similarity'] * row['pages'] for row in rows) / total_pages
+            line += f"  相似度 {fidelity:.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""命令行批处理：不启动页面，直接对输入目录运行各工具的处理函数
+
+用法示例：
+    python cli.py pdf-markdown ./input -o ./output --workers 8
+    python cli.py excel-title ./报表 ./归档.zip -o ./output --header-rows 3 --merge parquet
+    python cli.py word-to-pdf /mnt/share -o /mnt/share_pdf --sync
+"""
+import os
+import sys
+import time
+import argparse
+
+
+# 增量同步时保存清单的间隔（秒）
+SYNC_SAVE_INTERVAL = 30
+
+def build_parser() -> argparse.ArgumentParser:
+    from common.processors import TOOLS
+    
+    parser = argparse.ArgumentParser(description="数据预处理工具集 - 命令行批处理")
+    subparsers = parser.add_subparsers(dest="tool", required=True, metavar="工具")
+    
+    tool_parsers = {}
+    for name, (description, extensions, _) in TOOLS.items():
+        sub = subparsers.add_parser(name, help=f"{description}（{'/'.join(extensions)}）")
+        sub.add_argument("inputs", nargs="+", help="输入文件、目录（递归查找）或zip，输出中保留相对目录结构")
+        sub.add_argument("-o", "--output", required=True, help="输出目录")
+        sub.add_argument("--workers", type=int, default=0, help="并行进程数，默认使用全部CPU核心")
+        sub.add_argument("--chunk-size", type=int, default=0, help="每个子任务处理的文件数，默认按工具设置")
+        sub.add_argument("--sync", action="store_true",
+                         help="增量同步：只处理新增或修改的文件，删除已不存在的输入对应的输出（清单保存在输出目录中）")
+        tool_parsers[name] = sub
+    
+    sub = tool_parsers['excel-title']
+    sub.add_argument("--header-rows", type=int, default=2, help="合并多行表头的行数")
+    sub.add_argument("--title-check-rows", type=int, default=3, help="检查前几行作为标题删除")
+    sub.add_argument("--max-value-cols", type=int, default=2, help="标题行最多包含几列有值")
+    sub.add_argument("--compact", action="store_true", help="压缩数据类型")
+    sub.add_argument("--merge", choices=["csv", "parquet"], default="", help="将所有清洗结果合并为一个数据集")
+    
+    sub = tool_parsers['word-clean']
+    sub.add_argument("--keep-headers", action="store_true", help="保留页眉")
+    sub.add_argument("--keep-footers", action="store_true", help="保留页脚")
+    sub.add_argument("--remove-comments", action="store_true", help="删除批注")
+    sub.add_argument("--accept-revisions", action="store_true", help="接受所有修订")
+    sub.add_argument("--remove-hidden-text", action="store_true", help="删除隐藏文字")
+    sub.add_argument("--remove-properties", action="store_true", help="清除文档属性")
+    
+    sub = tool_parsers['pdf-markdown']
+    sub.add_argument("--mode", choices=["auto", "full", "fast"], default="auto", help="转换模式")
+    sub.add_argument("--page-range", default="", help="页码范围，如 1-20, 25（留空为全部页）")
+    sub.add_argument("--ignore-images", action="store_true", help="跳过图片")
+    sub.add_argument("--ignore-graphics", action="store_true", help="跳过矢量图形")
+    sub.add_argument("--skip-tables", action="store_true", help="跳过表格识别")
+    return parser
+
+
+def tool_options(args) -> dict:
+    """把命令行参数转换为与页面一致的处理选项"""
+    if args.tool == 'excel-title':
+        return {
+            'title_check_rows': args.title_check_rows,
+            'max_value_cols': args.max_value_cols,
+            'header_rows': args.header_rows,
+            'compact': args.compact,
+            'merge_format': args.merge,
+        }
+    if args.tool == 'word-clean':
+        return {
+            'remove_headers': not args.keep_headers,
+            'remove_footers': not args.keep_footers,
+            'remove_comments': args.remove_comments,
+            'accept_revisions': args.accept_revisions,
+            'remove_hidden_text': args.remove_hidden_text,
+            'remove_properties': args.remove_properties,
+        }
+    if args.tool == 'pdf-markdown':
+        return {
+            'mode': args.mode,
+            'page_range': args.page_range,
+            'ignore_images': args.ignore_images,
+            'ignore_graphics': args.ignore_graphics,
+            'detect_tables': not args.skip_tables,
+        }
+    return {}
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.workers > 0:
+        # 进程池在首次导入时读取进程数，需在导入前设置
+        os.environ["CDL_PROCESS_WORKERS"] = str(args.workers)
+    # 命令行不使用任务队列，不能领取共享任务存储中页面提交的任务
+    os.environ["CDL_EMBEDDED_WORKERS"] = "0"
+    
+    from common.processors import TOOLS, run_tool_to_directory
+    from common.process_pool import MAX_WORKERS, submit_ordered
+    from common.archive_input import expand_paths
+    from common import incremental_sync
+    
+    _, extensions, default_chunk_size = TOOLS[args.tool]
+    options = tool_options(args)
+    if args.sync and options.get('merge_format'):
+        print("合并数据集依赖全部输入，不能与--sync同时使用", file=sys.stderr)
+        return 2
+    files = expand_paths(args.inputs, extensions)
+    if not files and not args.sync:
+        print(f"未找到{'/'.join(extensions)}文件", file=sys.stderr)
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+    
+    if args.sync:
+        manifest = incremental_sync.load_manifest(args.output)
+        files, removed, unchanged = incremental_sync.plan_sync(manifest, files, args.tool, options)
+        incremental_sync.remove_sources(args.output, manifest, removed)
+        incremental_sync.save_manifest(args.output, manifest)
+        print(f"同步：{unchanged} 个文件未变化，{len(files)} 个新增或修改，{len(removed)} 个已删除", file=sys.stderr)
+        run_chunk = incremental_sync.sync_chunk
+    else:
+        run_chunk = run_tool_to_directory
+    
+    # 合并数据集需要在同一个子任务中处理全部文件
+    chunk_size = len(files) if options.get('merge_format') else (args.chunk_size or default_chunk_size)
+    chunks = [files[start:start + chunk_size] for start in range(0, len(files), chunk_size)]
+    total_bytes = sum(f.size for f in files)
+    print(f"{args.tool}: {len(files)} 个文件（{total_bytes / 1024 / 1024:.1f} MB），"
+          f"{len(chunks)} 个子任务，{MAX_WORKERS} 个进程", file=sys.stderr)
+    
+    start_time = last_save = time.time()
+    counts = {'success': 0, 'partial': 0, 'failed': 0}
+    failures = []
+    args_list = ((args.tool, chunk, args.output, options) for chunk in chunks)
+    done = 0
+    for chunk, future in zip(chunks, submit_ordered(run_chunk, args_list)):
+        try:
+            results = future.result()
+        except Exception as e:
+            results = [[f.name, f"❌ {str(e)[:50]}"] for f in chunk]
+        if args.sync:
+            if results and isinstance(results[0], tuple):
+                for file, (status, outputs, digest) in zip(chunk, results):
+                    incremental_sync.apply_result(args.output, manifest, file, status, outputs, digest)
+                results = [[file.name, status] for file, (status, _, _) in zip(chunk, results)]
+            # 定期保存清单，中途中断时已完成的文件不必重新处理
+            if time.time() - last_save > SYNC_SAVE_INTERVAL:
+                incremental_sync.save_manifest(args.output, manifest)
+                last_save = time.time()
+        for row in results:
+            status = str(row[-1])
+            if status.startswith('📦'):
+                continue  # 合并数据集的汇总行
+            if status.startswith('❌'):
+                counts['failed'] += 1
+                failures.append((row[0], status))
+            elif status.startswith('⚠️'):
+                counts['partial'] += 1
+                failures.append((row[0], status))
+            else:
+                counts['success'] += 1
+        done += len(chunk)
+        elapsed = time.time() - start_time
+        print(f"[{done}/{len(files)}] {elapsed:.1f}秒，{done / elapsed:.1f} 文件/秒", file=sys.stderr)
+    
+    if args.sync:
+        incremental_sync.save_manifest(args.output, manifest)
+    
+    elapsed = max(time.time() - start_time, 1e-6)
+    for name, status in failures:
+        print(f"{name}\t{status}")
+    print(f"完成：成功 {counts['success']}，部分完成 {counts['partial']}，失败 {counts['failed']}；"
+          f"耗时 {elapsed:.1f}秒，{len(files) / elapsed:.1f} 文件/秒，{total_bytes / 1024 / 1024 / elapsed:.2f} MB/秒；"
+          f"输出目录 {os.path.abspath(args.output)}")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import shutil
+import zipfile
+import tempfile
+from pathlib import Path, PurePosixPath
+
+
+# 上传的zip先落盘，压缩包内的文件在处理时才逐个解压读取
+UPLOAD_DIR = Path(os.environ.get("CDL_UPLOAD_DIR") or Path(tempfile.gettempdir()) / "cdl_uploads")
+UPLOAD_TTL = int(os.environ.get("CDL_RESULT_TTL", 3600))
+# 压缩包内需要忽略的系统文件
+IGNORED_PARTS = ('__MACOSX', '.DS_Store', 'Thumbs.db')
+
+
+class ArchiveEntry:
+    """压缩包中的单个文件，接口与UploadedFile一致（name/file_id/getvalue），读取时才解压"""
+    
+    def __init__(self, zip_path, member, name, file_id, size):
+        self.zip_path = str(zip_path)
+        self.member = member
+        self.name = name          # 压缩包内的相对路径，用于在输出中保留目录结构
+        self.file_id = file_id
+        self.size = size
+    
+    def getvalue(self) -> bytes:
+        with zipfile.ZipFile(self.zip_path) as zf:
+            return zf.read(self.member)
+
+
+class LocalFile:
+    """本地磁盘上的文件（命令行批处理），接口与UploadedFile一致，读取时才加载内容"""
+    
+    def __init__(self, path, name):
+        stat = os.stat(path)
+        self.path = str(path)
+        self.name = name          # 相对输入目录的路径，用于在输出中保留目录结构
+        self.file_id = f"{self.path}:{stat.st_size}:{stat.st_mtime_ns}"
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+    
+    def getvalue(self) -> bytes:
+        return Path(self.path).read_bytes()
+
+
+def expand_uploads(uploaded_files, extensions) -> list:
+    """展开上传文件：普通文件原样返回，zip展开为其中扩展名匹配的文件（保留目录结构）"""
+    extensions = tuple(ext.lower() for ext in extensions)
+    inputs = []
+    for file in uploaded_files:
+        if file.name.lower().endswith('.zip') and '.zip' not in extensions:
+            inputs.extend(_archive_entries(file, extensions))
+        elif file.name.lower().endswith(extensions):
+            inputs.append(file)
+    return inputs
+
+
+def expand_paths(paths, extensions) -> list:
+    """展开本地路径：目录递归查找匹配的文件，zip展开为其中匹配的文件；文件名为相对输入目录的路径"""
+    extensions = tuple(ext.lower() for ext in extensions)
+    inputs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            base, candidates = path, sorted(p for p in path.rglob('*') if p.is_file())
+        else:
+            base, candidates = path.parent, [path]
+        for file_path in candidates:
+            name = file_path.relative_to(base).as_posix()
+            if any(part in IGNORED_PARTS or part.startswith('._') for part in name.split('/')):
+                continue
+            if name.lower().endswith('.zip') and '.zip' not in extensions:
+                # 压缩包内的文件按所在目录展开，与上传zip的处理方式一致
+                prefix = str(PurePosixPath(name).parent)
+                inputs.extend(_zip_entries(file_path, extensions, str(file_path), '' if prefix == '.' else prefix))
+            elif name.lower().endswith(extensions):
+                inputs.append(LocalFile(file_path, name))
+    return inputs
+
+
+def output_stem(name: str) -> str:
+    """输出文件名（不含扩展名），保留压缩包内的目录，如 部门A/报表.xlsx -> 部门A/报表"""
+    path = PurePosixPath(name.replace('\\', '/'))
+    return str(path.with_suffix('')) if path.suffix else str(path)
+
+
+def _archive_entries(file, extensions) -> list:
+    """把上传的zip写入磁盘，返回其中匹配文件的惰性引用"""
+    return _zip_entries(_spool_upload(file), extensions, file.file_id)
+
+
+def _zip_entries(zip_path, extensions, id_prefix, name_prefix='') -> list:
+    """读取zip目录，返回扩展名匹配的文件（忽略系统文件）"""
+    entries = []
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            name = _safe_name(_decode_name(info))
+            parts = name.split('/') if name else []
+            if not parts or any(part in IGNORED_PARTS or part.startswith('._') for part in parts):
+                continue
+            if name.lower().endswith(extensions):
+                if name_prefix:
+                    name = f"{name_prefix}/{name}"
+                entries.append(ArchiveEntry(zip_path, info.filename, name, f"{id_prefix}/{info.filename}", info.file_size))
+    return entries
+
+
+def _spool_upload(file) -> Path:
+    """上传的zip按file_id落盘一次，重复运行页面时直接复用；同时清理过期的上传文件"""
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    for path in UPLOAD_DIR.glob("*.zip"):
+        try:
+            if now - path.stat().st_mtime > UPLOAD_TTL:
+                path.unlink(missing_ok=True)
+        except FileNotFoundError:
+            continue
+    
+    zip_path = UPLOAD_DIR / f"{re.sub(r'[^0-9A-Za-z_-]', '_', str(file.file_id))}.zip"
+    if not zip_path.exists():
+        temp_path = zip_path.with_suffix('.tmp')
+        file.seek(0)
+        with open(temp_path, 'wb') as dest:
+            shutil.copyfileobj(file, dest, 1024 * 1024)
+        temp_path.replace(zip_path)
+    os.utime(zip_path)
+    return zip_path
+
+
+def _decode_name(info) -> str:
+    """未标记UTF-8的文件名按GBK解码（Windows中文系统压缩的zip）"""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode('gbk')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def _safe_name(name: str) -> str:
+    """去掉绝对路径、盘符和..，防止路径穿越"""
+    parts = [part for part in PurePosixPath(name.replace('\\', '/')).parts
+             if part not in ('/', '.', '..') and not part.endswith(':')]
+    return '/'.join(parts)
@@ -0,0 +1,269 @@
+import io
+import shutil
+import zipfile
+import posixpath
+from lxml import etree
+
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+EP_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/extended-properties'
+
+REL_TYPE_PREFIX = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+CORE_PROPERTIES_REL = 'http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties'
+THUMBNAIL_REL = 'http://schemas.openxmlformats.org/package/2006/relationships/metadata/thumbnail'
+
+# 批注相关部件的关系类型后缀（含Word 2010+扩展部件）
+COMMENT_REL_SUFFIXES = ('/comments', '/commentsExtended', '/commentsIds', '/commentsExtensible', '/people')
+# 含正文内容、需要做批注/修订/隐藏文字处理的部件
+STORY_REL_SUFFIXES = ('/header', '/footer', '/footnotes', '/endnotes', '/comments')
+
+# 修订标记：删除类连同内容删除，插入类保留内容去掉标记，属性修订直接删除
+REVISION_REMOVE_TAGS = ('del', 'moveFrom')
+REVISION_UNWRAP_TAGS = ('ins', 'moveTo')
+REVISION_MARKER_TAGS = ('rPrChange', 'pPrChange', 'sectPrChange', 'tblPrChange', 'tblPrExChange', 'trPrChange',
+                        'tcPrChange', 'tblGridChange', 'numberingChange', 'cellIns', 'cellDel', 'cellMerge',
+                        'moveFromRangeStart', 'moveFromRangeEnd', 'moveToRangeStart', 'moveToRangeEnd')
+COMMENT_MARKER_TAGS = ('commentRangeStart', 'commentRangeEnd', 'commentReference')
+APP_PERSONAL_TAGS = ('Company', 'Manager', 'Template', 'HyperlinkBase')
+
+# 已经是压缩格式的媒体，复制时直接存储，不再重复deflate
+STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.wdp', '.mp3', '.mp4', '.zip'}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def clean_docx(content: bytes, **options) -> bytes:
+    """清理DOCX，返回清理后的文件内容，选项见clean_docx_stream"""
+    output = io.BytesIO()
+    clean_docx_stream(io.BytesIO(content), output, **options)
+    return output.getvalue()
+
+
+def clean_docx_stream(src, dst, remove_headers: bool = True, remove_footers: bool = True,
+                      remove_comments: bool = False, accept_revisions: bool = False,
+                      remove_hidden_text: bool = False, remove_properties: bool = False):
+    """流式清理DOCX：一次遍历文档包，只改写涉及的XML部件，其余条目原样复制
+    
+    - remove_headers/remove_footers：删除页眉/页脚部件及sectPr中的引用
+    - remove_comments：删除批注部件及正文中的批注范围和引用
+    - accept_revisions：接受所有修订（保留插入、丢弃删除、去掉格式修订记录）并关闭修订跟踪
+    - remove_hidden_text：删除设置了隐藏格式的文字
+    - remove_properties：清空核心属性、删除自定义属性和缩略图，去掉扩展属性中的公司等信息
+    """
+    removed_suffixes = ()
+    if remove_headers:
+        removed_suffixes += ('/header',)
+    if remove_footers:
+        removed_suffixes += ('/footer',)
+    if remove_comments:
+        removed_suffixes += COMMENT_REL_SUFFIXES
+    
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, 'w', zipfile.ZIP_DEFLATED) as zout:
+        main_part = _main_document_part(zin)
+        main_rels = _rels_name(main_part)
+        rewrites = {}       # 部件名 -> 需要依次应用的修改
+        removed_ids = {}    # 关系文件名 -> 要删除的关系Id
+        removed_parts = set()
+        
+        def add_rewrite(part_name, transform):
+            rewrites.setdefault(part_name, []).append(transform)
+        
+        def remove_relationship(rels_name, source_part, rel):
+            removed_ids.setdefault(rels_name, set()).add(rel.get('Id'))
+            removed_parts.add(_resolve_target(source_part, rel.get('Target')))
+        
+        # 包关系：文档属性
+        if remove_properties:
+            for rel in _read_relationships(zin, '_rels/.rels'):
+                rel_type = rel.get('Type')
+                if rel_type in (REL_TYPE_PREFIX + 'custom-properties', THUMBNAIL_REL):
+                    remove_relationship('_rels/.rels', '', rel)
+                elif rel_type == CORE_PROPERTIES_REL:
+                    add_rewrite(_resolve_target('', rel.get('Target')), _clear_core_properties)
+                elif rel_type == REL_TYPE_PREFIX + 'extended-properties':
+                    add_rewrite(_resolve_target('', rel.get('Target')), _clear_app_properties)
+        
+        # 主文档关系：页眉页脚、批注、脚注尾注、设置
+        story_parts = [main_part]
+        for rel in _read_relationships(zin, main_rels):
+            rel_type = rel.get('Type', '')
+            if rel_type.endswith(removed_suffixes):
+                remove_relationship(main_rels, main_part, rel)
+            elif rel_type.endswith(STORY_REL_SUFFIXES):
+                story_parts.append(_resolve_target(main_part, rel.get('Target')))
+            elif accept_revisions and rel_type == REL_TYPE_PREFIX + 'settings':
+                add_rewrite(_resolve_target(main_part, rel.get('Target')), _disable_track_revisions)
+        
+        main_removed_ids = removed_ids.get(main_rels, set())
+        add_rewrite(main_part, lambda root: _drop_section_references(root, main_removed_ids))
+        for part in story_parts:
+            if remove_comments:
+                add_rewrite(part, _drop_comment_markers)
+            if accept_revisions:
+                add_rewrite(part, _accept_revisions)
+            if remove_hidden_text:
+                add_rewrite(part, _drop_hidden_runs)
+        for rels_name, ids in removed_ids.items():
+            add_rewrite(rels_name, lambda root, ids=ids: _drop_relationships(root, ids))
+        add_rewrite('[Content_Types].xml', lambda root: _drop_overrides(root, removed_parts))
+        
+        # 单次遍历：删除、改写或原样复制每个条目
+        removed_names = removed_parts | {_rels_name(part) for part in removed_parts}
+        for info in zin.infolist():
+            if info.filename in removed_names:
+                continue
+            transforms = rewrites.get(info.filename)
+            if transforms:
+                zout.writestr(_new_info(info), _rewrite_xml(zin.read(info), transforms))
+            else:
+                _copy_entry(zin, zout, info)
+
+
+def _main_document_part(zin):
+    """从包关系中定位主文档部件，默认word/document.xml"""
+    for rel in _read_relationships(zin, '_rels/.rels'):
+        if rel.get('Type') == REL_TYPE_PREFIX + 'officeDocument':
+            return rel.get('Target').lstrip('/')
+    return 'word/document.xml'
+
+
+def _read_relationships(zin, rels_name):
+    """读取关系文件中的内部关系"""
+    if rels_name not in zin.NameToInfo:
+        return []
+    return [rel for rel in etree.fromstring(zin.read(rels_name)) if rel.get('TargetMode') != 'External']
+
+
+def _rels_name(part_name):
+    """部件对应的关系文件名，如 word/document.xml -> word/_rels/document.xml.rels"""
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, '_rels', f'{name}.rels')
+
+
+def _resolve_target(source_part, target):
+    """把关系中的相对Target解析为包内路径"""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+
+def _rewrite_xml(data, transforms):
+    """解析XML并依次应用修改，保留原有的命名空间前缀和standalone声明"""
+    tree = etree.ElementTree(etree.fromstring(data))
+    for transform in transforms:
+        transform(tree.getroot())
+    buffer = io.BytesIO()
+    tree.write(buffer, xml_declaration=True, encoding='UTF-8', standalone=tree.docinfo.standalone)
+    return buffer.getvalue()
+
+
+def _w(*tags):
+    return [f'{{{W_NS}}}{tag}' for tag in tags]
+
+
+def _remove(element):
+    parent = element.getparent()
+    if parent is not None:
+        parent.remove(element)
+
+
+def _unwrap(element):
+    """去掉元素本身，保留其子元素"""
+    parent = element.getparent()
+    if parent is None:
+        return
+    index = parent.index(element)
+    for child in reversed(list(element)):
+        parent.insert(index, child)
+    parent.remove(element)
+
+
+def _drop_section_references(root, removed_ids):
+    """删除sectPr中指向已删除部件的页眉/页脚引用"""
+    for ref in list(root.iter(*_w('headerReference', 'footerReference'))):
+        if ref.get(f'{{{R_NS}}}id') in removed_ids:
+            _remove(ref)
+
+
+def _drop_comment_markers(root):
+    """删除批注范围和引用，引用所在的空run一并删除"""
+    for marker in list(root.iter(*_w(*COMMENT_MARKER_TAGS))):
+        run = marker.getparent()
+        _remove(marker)
+        if run is not None and run.tag == f'{{{W_NS}}}r' and all(child.tag == f'{{{W_NS}}}rPr' for child in run):
+            _remove(run)
+
+
+def _accept_revisions(root):
+    """接受所有修订"""
+    for element in list(root.iter(*_w(*REVISION_REMOVE_TAGS))):
+        parent = element.getparent()
+        # 表格行属性中的删除标记表示整行被删除
+        if parent is not None and parent.tag == f'{{{W_NS}}}trPr' and element.tag == f'{{{W_NS}}}del':
+            _remove(parent.getparent())
+        else:
+            _remove(element)
+    for element in list(root.iter(*_w(*REVISION_UNWRAP_TAGS))):
+        _unwrap(element)
+    for element in list(root.iter(*_w(*REVISION_MARKER_TAGS))):
+        _remove(element)
+
+
+def _drop_hidden_runs(root):
+    """删除设置了隐藏格式（w:vanish）的run，段落标记上的隐藏格式只去掉标记"""
+    for vanish in list(root.iter(*_w('vanish'))):
+        if vanish.get(f'{{{W_NS}}}val') in ('0', 'false', 'off'):
+            continue
+        rpr = vanish.getparent()
+        run = rpr.getparent() if rpr is not None else None
+        if run is not None and run.tag == f'{{{W_NS}}}r':
+            _remove(run)
+        else:
+            _remove(vanish)
+
+
+def _disable_track_revisions(root):
+    for element in list(root.iter(*_w('trackRevisions'))):
+        _remove(element)
+
+
+def _clear_core_properties(root):
+    """清空核心属性（作者、标题、修改人、时间等）"""
+    for child in list(root):
+        root.remove(child)
+
+
+def _clear_app_properties(root):
+    for element in list(root.iter(*[f'{{{EP_NS}}}{tag}' for tag in APP_PERSONAL_TAGS])):
+        _remove(element)
+
+
+def _drop_relationships(root, removed_ids):
+    for rel in list(root):
+        if rel.get('Id') in removed_ids:
+            root.remove(rel)
+
+
+def _drop_overrides(root, removed_parts):
+    for override in root.findall(f'{{{CT_NS}}}Override'):
+        if override.get('PartName', '').lstrip('/') in removed_parts:
+            root.remove(override)
+
+
+def _new_info(info, compress_type=None):
+    """复制条目元信息（名称、时间、属性）"""
+    new_info = zipfile.ZipInfo(info.filename, info.date_time)
+    new_info.compress_type = info.compress_type if compress_type is None else compress_type
+    new_info.external_attr = info.external_attr
+    return new_info
+
+
+def _copy_entry(zin, zout, info):
+    """分块复制条目内容，已压缩的媒体直接存储"""
+    is_stored = posixpath.splitext(info.filename)[1].lower() in STORED_EXTENSIONS
+    new_info = _new_info(info, zipfile.ZIP_STORED if is_stored else None)
+    new_info.file_size = info.file_size  # 供zipfile判断是否需要zip64
+    with zin.open(info) as src, zout.open(new_info, 'w') as dest:
+        shutil.copyfileobj(src, dest, COPY_CHUNK_SIZE)
@@ -0,0 +1,393 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import ipaddress
+import threading
+from functools import partial
+from pathlib import Path
+from urllib.parse import quote
+import tornado.web
+from tornado.ioloop import IOLoop
+from common.archive_input import UPLOAD_DIR, expand_paths
+from common.file_processing_queue import fp_queue
+from common.libreoffice_queue import lo_queue
+from common.pdf_converter import parse_page_spans
+from common.processors import DEFAULT_OPTIONS, LIBREOFFICE_TOOLS, TOOLS, run_tool
+from common.processors.libreoffice import write_results
+from common.result_store import (RESULT_TTL, ResultWriter, delete_result, list_result_files, result_archive_path,
+                                 result_exists, result_file_path, save_result)
+from common.task_store import TASK_STORE, QueueFullError
+
+
+# HTTP接口端口（设为0不启动）、监听地址、访问令牌（为空时不校验）和单次上传大小上限；
+# 默认只监听本机，监听其他地址时必须设置访问令牌，否则不启动
+API_PORT = int(os.environ.get("CDL_API_PORT", 8420))
+API_ADDRESS = os.environ.get("CDL_API_ADDRESS", "127.0.0.1")
+API_TOKEN = os.environ.get("CDL_API_TOKEN", "")
+API_MAX_UPLOAD_BYTES = int(os.environ.get("CDL_API_MAX_MB", 2048)) * 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024
+FINISHED = ('completed', 'failed', 'expired')
+# 使用SQLite任务存储时任务记录也保存到磁盘，服务重启后仍可查询状态和下载结果
+JOB_DIR = UPLOAD_DIR / "api_jobs"
+QUEUES = {fp_queue.queue_name: fp_queue, lo_queue.queue_name: lo_queue}
+
+_jobs = {}  # job_id -> job_dict
+_jobs_lock = threading.Lock()
+_server_thread = None
+_server_lock = threading.Lock()
+
+
+def start_api_server():
+    """在后台线程中启动HTTP任务接口，与页面共用同一进程内的队列（重复调用只启动一次）"""
+    global _server_thread
+    if not API_PORT:
+        return
+    if not API_TOKEN and not _is_loopback(API_ADDRESS):
+        print(f"HTTP任务接口未启动：监听 {API_ADDRESS} 时需设置 CDL_API_TOKEN", file=sys.stderr)
+        return
+    with _server_lock:
+        if _server_thread is None:
+            _server_thread = threading.Thread(target=_serve, name="cdl-http-api", daemon=True)
+            _server_thread.start()
+
+
+def _is_loopback(address: str) -> bool:
+    if address == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def make_app() -> tornado.web.Application:
+    return tornado.web.Application([
+        (r"/api/tools", ToolsHandler),
+        (r"/api/jobs", JobsHandler),
+        (r"/api/jobs/([0-9a-f]{32})", JobHandler),
+        (r"/api/jobs/([0-9a-f]{32})/result", JobResultHandler),
+    ])
+
+
+def _serve():
+    async def main():
+        _load_jobs()
+        make_app().listen(API_PORT, API_ADDRESS, max_body_size=API_MAX_UPLOAD_BYTES)
+        await asyncio.Event().wait()
+    
+    asyncio.run(main())
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def prepare(self):
+        if API_TOKEN and self.request.headers.get("Authorization") != f"Bearer {API_TOKEN}":
+            raise tornado.web.HTTPError(401, "访问令牌无效")
+    
+    def write_error(self, status_code, **kwargs):
+        # 错误说明放在响应体中（HTTP状态行只能是ASCII）
+        error = kwargs.get('exc_info', (None, None, None))[1]
+        if status_code == 429:
+            self.set_header("Retry-After", "30")
+        if isinstance(error, tornado.web.HTTPError) and error.log_message:
+            self.finish({'error': error.log_message % error.args})
+        else:
+            self.finish({'error': self._reason})
+    
+    def get_job(self, job_id) -> dict:
+        job = _jobs.get(job_id)
+        if job is None:
+            raise tornado.web.HTTPError(404, "任务不存在")
+        return job
+
+
+class ToolsHandler(BaseHandler):
+    def get(self):
+        """可用的工具、输入扩展名和处理选项默认值"""
+        self.finish({name: {'description': description, 'extensions': list(extensions),
+                            'options': DEFAULT_OPTIONS.get(name, {})}
+                     for name, (description, extensions, _) in TOOLS.items()})
+
+
+@tornado.web.stream_request_body
+class JobsHandler(BaseHandler):
+    """提交任务：请求体为单个文件或zip，边接收边写入磁盘，不在内存中缓存整个上传"""
+    
+    def prepare(self):
+        super().prepare()
+        self.tool = self.get_query_argument('tool', '')
+        if self.tool not in TOOLS:
+            raise tornado.web.HTTPError(400, f"未知工具: {self.tool}")
+        filename = Path(self.get_query_argument('filename', '').replace('\\', '/')).name
+        if not filename.lower().endswith(TOOLS[self.tool][1] + ('.zip',)):
+            raise tornado.web.HTTPError(400, f"filename需为{'/'.join(TOOLS[self.tool][1] + ('.zip',))}文件")
+        self.options = _parse_options(self.tool, self.request.query_arguments)
+        
+        self.job_id = uuid.uuid4().hex
+        self.upload_dir = UPLOAD_DIR / "api" / self.job_id
+        self.upload_dir.mkdir(parents=True)
+        self.upload_file = open(self.upload_dir / filename, 'wb')
+    
+    def data_received(self, chunk):
+        self.upload_file.write(chunk)
+    
+    async def post(self):
+        # 上传已接收完，之后的清理由提交过程负责
+        self.upload_file.close()
+        self.upload_file = None
+        # 展开zip、复制输入和清理过期任务都会读写磁盘，在线程池中执行，不阻塞事件循环
+        info = await IOLoop.current().run_in_executor(None, _accept_upload, self.job_id, self.tool, self.options,
+                                                      self.upload_dir, f"api:{self.request.remote_ip}")
+        self.set_status(202)
+        self.finish(info)
+    
+    def on_connection_close(self):
+        # 上传中断时清理已写入的部分
+        if getattr(self, 'upload_file', None) is not None:
+            self.upload_file.close()
+            shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+
+class JobHandler(BaseHandler):
+    async def get(self, job_id):
+        """任务状态、排队位置、进度；完成后包含处理结果和结果文件列表"""
+        job = self.get_job(job_id)
+        # 查询任务存储、发布结果都会读写磁盘，在线程池中执行
+        self.finish(await IOLoop.current().run_in_executor(None, _job_status, job))
+    
+    async def delete(self, job_id):
+        """取消未结束的任务（排队中的移出队列，处理中的停止），或删除已结束任务的结果"""
+        job = self.get_job(job_id)
+        await IOLoop.current().run_in_executor(None, _cancel_job, job)
+        self.set_status(204)
+
+
+class JobResultHandler(BaseHandler):
+    async def get(self, job_id):
+        """分块下载结果：默认整个zip，指定file参数时下载单个结果文件"""
+        job = self.get_job(job_id)
+        if job['status'] != 'completed':
+            raise tornado.web.HTTPError(409, f"任务状态为{job['status']}，没有可下载的结果")
+        
+        name = self.get_query_argument('file', None)
+        loop = IOLoop.current()
+        if name:
+            path = await loop.run_in_executor(None, result_file_path, job['result_handle'], name)
+            filename, content_type = Path(name).name, "application/octet-stream"
+        else:
+            path = await loop.run_in_executor(None, result_archive_path, job['result_handle'])
+            filename, content_type = f"{job['tool']}_{job_id}.zip", "application/zip"
+        if path is None:
+            raise tornado.web.HTTPError(404, "结果已过期清理或文件不存在")
+        
+        self.set_header("Content-Type", content_type)
+        self.set_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(filename)}")
+        self.set_header("Content-Length", path.stat().st_size)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.write(chunk)
+                await self.flush()
+        self.finish()
+
+
+def _parse_options(tool: str, arguments: dict) -> dict:
+    """从查询参数读取处理选项，按默认值的类型转换"""
+    options = {}
+    for key, default in DEFAULT_OPTIONS.get(tool, {}).items():
+        if key not in arguments:
+            continue
+        value = arguments[key][-1].decode('utf-8')
+        try:
+            if isinstance(default, bool):
+                value = value.lower() in ('1', 'true', 'yes', 'on')
+            elif isinstance(default, int):
+                value = int(value)
+            elif key == 'page_range':
+                parse_page_spans(value)
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, f"参数{key}无效: {e}")
+        options[key] = value
+    return options
+
+
+def _accept_upload(job_id, tool, options, upload_dir, owner) -> dict:
+    """展开已接收的上传并提交任务，返回任务信息；没有可处理的文件或超过排队限制时删除上传"""
+    files = expand_paths([upload_dir], TOOLS[tool][1])
+    if not files:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise tornado.web.HTTPError(400, f"未找到{'/'.join(TOOLS[tool][1])}文件")
+    
+    _prune_jobs()
+    try:
+        # 按客户端地址限制排队的任务数和文件大小
+        job = _submit_job(job_id, tool, files, options, upload_dir, owner)
+    except QueueFullError as e:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise tornado.web.HTTPError(429, "%s", str(e))
+    except BaseException:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
+    return _job_info(job)
+
+
+def _submit_job(job_id, tool, files, options, upload_dir, owner) -> dict:
+    """LibreOffice工具提交到lo_queue，其余提交到fp_queue；超过排队限制时抛出QueueFullError"""
+    meta = {'owner': owner, 'tool': tool}
+    if tool in LIBREOFFICE_TOOLS:
+        queue = lo_queue
+        task_id = lo_queue.submit_task([(f.name, f) for f in files], *LIBREOFFICE_TOOLS[tool], meta=meta)
+    else:
+        queue = fp_queue
+        task_id = fp_queue.submit_task(files, partial(_run_job, tool, options, upload_dir), meta=meta)
+    
+    job = {
+        'job_id': job_id,
+        'tool': tool,
+        'queue': queue,
+        'task_id': task_id,
+        'upload_dir': upload_dir,
+        'file_count': len(files),
+        'status': 'waiting',
+        'results': None,
+        'result_handle': None,
+        'error': None,
+        'created_time': time.time(),
+        'lock': threading.Lock(),
+    }
+    with _jobs_lock:
+        _jobs[job_id] = job
+    _save_job(job)
+    return job
+
+
+def _run_job(tool, options, upload_dir, files):
+    """fp_queue中执行的处理函数，处理完成后删除上传的输入"""
+    try:
+        with ResultWriter() as writer:
+            results = run_tool(tool, files, writer, options)
+        return writer, results
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def _finalize_job(job):
+    """取回队列中已完成任务的结果并发布到结果存储"""
+    with job['lock']:
+        if job['status'] in FINISHED:
+            return
+        result = job['queue'].wait_for_task(job['task_id'], timeout=1)
+        try:
+            if result is None:
+                job['status'], job['error'] = 'failed', "任务结果已丢失"
+                return
+            if job['tool'] in LIBREOFFICE_TOOLS:
+                writer, results = write_results(result, LIBREOFFICE_TOOLS[job['tool']][1])
+            else:
+                writer, results = result
+            job['result_handle'], job['results'] = save_result(writer), results
+            job['status'] = 'completed'
+        finally:
+            shutil.rmtree(job['upload_dir'], ignore_errors=True)
+            _save_job(job)
+
+
+def _job_status(job) -> dict:
+    """任务信息；队列中已完成的任务先发布结果"""
+    if job['status'] not in FINISHED and job['queue'].get_task_status(job['task_id']) == 'completed':
+        _finalize_job(job)
+    return _job_info(job)
+
+
+def _cancel_job(job):
+    if job['status'] not in FINISHED:
+        job['queue'].cancel_task(job['task_id'])
+    _remove_job(job)
+
+
+def _job_info(job) -> dict:
+    """任务信息（会读取任务存储和结果目录，在线程池中调用）"""
+    queue, task_id = job['queue'], job['task_id']
+    # 与_finalize_job互斥：结果取出后、发布前任务已从队列删除，不能据此判断为过期
+    with job['lock']:
+        status = job['status']
+        if status not in FINISHED:
+            status = queue.get_task_status(task_id)
+            if status is None:
+                # 队列已清理该任务（排队期间长时间未查询状态），不会再有结果
+                job['status'], job['error'] = 'expired', "任务排队期间长时间未查询状态，已被清理"
+                shutil.rmtree(job['upload_dir'], ignore_errors=True)
+                _save_job(job)
+                status = 'expired'
+            elif status == 'failed':
+                # 处理出错，或多次领取都未完成（处理进程反复崩溃），任务存储已放弃
+                job['status'], job['error'] = 'failed', queue.get_task_error(task_id) or "任务多次执行中断，已放弃"
+                shutil.rmtree(job['upload_dir'], ignore_errors=True)
+                _save_job(job)
+            elif status == 'completed':
+                status = 'processing'  # 队列已完成，结果在查询状态时才发布
+    
+    info = {'job_id': job['job_id'], 'tool': job['tool'], 'status': status, 'file_count': job['file_count'],
+            'created_time': job['created_time']}
+    if status == 'waiting':
+        info['position'] = queue.get_task_position(task_id)
+    if status == 'processing' and queue is fp_queue:
+        info['progress'] = fp_queue.get_task_progress(task_id)
+    if status in ('waiting', 'processing'):
+        info['retained_bytes'] = queue.get_task_bytes(task_id)
+    if status == 'completed':
+        info['results'] = job['results']
+        info['result_files'] = list_result_files(job['result_handle'])
+        info['result_available'] = result_exists(job['result_handle'])
+    if job['error']:
+        info['error'] = job['error']
+    return info
+
+
+def _remove_job(job):
+    with _jobs_lock:
+        _jobs.pop(job['job_id'], None)
+    if job['result_handle']:
+        delete_result(job['result_handle'])
+    shutil.rmtree(job['upload_dir'], ignore_errors=True)
+    (JOB_DIR / f"{job['job_id']}.json").unlink(missing_ok=True)
+
+
+def _prune_jobs():
+    """移除结果已过期清理或结束超过保留时间的任务记录"""
+    now = time.time()
+    for job in list(_jobs.values()):
+        if job['status'] == 'completed' and not result_exists(job['result_handle']):
+            _remove_job(job)
+        elif job['status'] in ('failed', 'expired') and now - job['created_time'] > RESULT_TTL:
+            _remove_job(job)
+
+
+def _save_job(job):
+    if TASK_STORE != "sqlite":
+        return
+    record = {key: value for key, value in job.items() if key != 'lock'}
+    record.update(queue=job['queue'].queue_name, upload_dir=str(job['upload_dir']))
+    JOB_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = JOB_DIR / f"{job['job_id']}.tmp"
+    temp_path.write_text(json.dumps(record, ensure_ascii=False, default=str), encoding='utf-8')
+    temp_path.replace(JOB_DIR / f"{job['job_id']}.json")
+
+
+def _load_jobs():
+    """启动时恢复磁盘上的任务记录，未完成的任务由任务存储继续处理"""
+    if TASK_STORE != "sqlite" or not JOB_DIR.exists():
+        return
+    for path in JOB_DIR.glob("*.json"):
+        try:
+            job = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        job.update(queue=QUEUES[job['queue']], upload_dir=Path(job['upload_dir']), lock=threading.Lock())
+        with _jobs_lock:
+            _jobs.setdefault(job['job_id'], job)
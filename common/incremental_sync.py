@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from common.archive_input import LocalFile, output_stem
+from common.result_store import DirectoryWriter
+
+
+# 同步清单保存在输出目录中，记录每个输入的大小、修改时间、内容哈希和对应的输出文件
+MANIFEST_NAME = ".cdl_sync.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def load_manifest(out_dir) -> dict:
+    path = Path(out_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {'tool': None, 'params': None, 'files': {}}
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def save_manifest(out_dir, manifest: dict):
+    """原子写入清单，中途中断时不会留下损坏的文件"""
+    path = Path(out_dir) / MANIFEST_NAME
+    temp_path = path.with_suffix('.tmp')
+    temp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+    temp_path.replace(path)
+
+
+def file_digest(file) -> str:
+    """文件内容的sha256（本地文件分块读取）"""
+    digest = hashlib.sha256()
+    if isinstance(file, LocalFile):
+        with open(file.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    else:
+        digest.update(file.getvalue())
+    return digest.hexdigest()
+
+
+def plan_sync(manifest: dict, files: list, tool: str, options: dict):
+    """对比清单，返回 (需要处理的文件, 已删除的输入名, 未变化的文件数)
+    
+    大小和修改时间都没变的直接跳过；变了的再比较内容哈希，内容相同只更新记录
+    """
+    records = manifest['files']
+    if manifest['tool'] != tool or manifest['params'] != options:
+        # 工具或参数变化后全部重新处理；先把记录标记为过期，中途中断时下次仍会重新处理
+        for record in records.values():
+            record.update(size=-1, sha256='')
+        manifest['tool'], manifest['params'] = tool, options
+    
+    pending, unchanged, names = [], 0, set()
+    for file in files:
+        names.add(file.name)
+        record = records.get(file.name)
+        if record is None:
+            pending.append(file)
+            continue
+        size, mtime_ns = _stat_key(file)
+        if record['size'] == size and record['mtime_ns'] == mtime_ns:
+            unchanged += 1
+        elif record['sha256'] and record['sha256'] == file_digest(file):
+            # 内容未变（如重新复制导致修改时间变化），只更新记录
+            record.update(size=size, mtime_ns=mtime_ns)
+            unchanged += 1
+        else:
+            pending.append(file)
+    
+    removed = [name for name in records if name not in names]
+    return pending, removed, unchanged
+
+
+def remove_sources(out_dir, manifest: dict, names: list):
+    """删除已不存在的输入对应的输出文件和记录"""
+    for name in names:
+        record = manifest['files'].pop(name)
+        _remove_outputs(out_dir, record['outputs'])
+
+
+def apply_result(out_dir, manifest: dict, file, status: str, outputs: list, digest: str):
+    """记录处理结果：成功时删除旧版本多出的输出；失败或部分完成时保留输出并标记为下次重试"""
+    old_outputs = manifest['files'].get(file.name, {}).get('outputs', [])
+    size, mtime_ns = _stat_key(file)
+    if status.startswith(('❌', '⚠️')):
+        manifest['files'][file.name] = {'size': -1, 'mtime_ns': mtime_ns, 'sha256': '',
+                                        'outputs': sorted(set(old_outputs) | set(outputs))}
+        return
+    _remove_outputs(out_dir, set(old_outputs) - set(outputs))
+    manifest['files'][file.name] = {'size': size, 'mtime_ns': mtime_ns, 'sha256': digest, 'outputs': outputs}
+
+
+def sync_chunk(tool: str, files: list, out_dir: str, options: dict = None) -> list:
+    """增量同步的子任务（在进程池中运行）：逐个文件处理以记录各自的输出，返回 [(状态, 输出文件列表, 内容哈希)]"""
+    from common.processors import LIBREOFFICE_TOOLS, run_tool
+    
+    digests = [file_digest(file) for file in files]
+    if tool in LIBREOFFICE_TOOLS:
+        # LibreOffice每次启动开销大，仍按组转换；输出文件名由输入文件名确定
+        with DirectoryWriter(out_dir) as writer:
+            rows = run_tool(tool, files, writer, options)
+        target_ext = LIBREOFFICE_TOOLS[tool][1]
+        outputs = [[f"{output_stem(row[0])}.{target_ext}"] if row[-1].startswith('✅') else [] for row in rows]
+    else:
+        rows, outputs = [], []
+        for file in files:
+            with DirectoryWriter(out_dir) as writer:
+                rows.append(run_tool(tool, [file], writer, options)[0])
+            outputs.append(list(writer.names))
+    return [(str(row[-1]), output, digest) for row, output, digest in zip(rows, outputs, digests)]
+
+
+def _stat_key(file):
+    """(大小, 修改时间)；压缩包内的文件使用压缩包的修改时间"""
+    if isinstance(file, LocalFile):
+        return file.size, file.mtime_ns
+    return file.size, os.stat(file.zip_path).st_mtime_ns
+
+
+def _remove_outputs(out_dir, names):
+    """删除输出文件，并清理随之变空的目录"""
+    root = Path(out_dir).resolve()
+    for name in names:
+        path = (root / name).resolve()
+        if root not in path.parents:
+            continue
+        path.unlink(missing_ok=True)
+        parent = path.parent
+        while parent != root:
+            try:
+                parent.rmdir()  # 只能删除空目录，非空或已删除时停止
+            except OSError:
+                break
+            parent = parent.parent
@@ -0,0 +1,175 @@
+import io
+import os
+import time
+import zlib
+import shutil
+import zipfile
+import tempfile
+import threading
+import posixpath
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 本身已压缩的输出格式，打包时直接存储，不再重复deflate
+STORED_EXTENSIONS = {'.xlsx', '.docx', '.pdf', '.parquet', '.zip', '.png', '.jpg', '.jpeg', '.gif'}
+
+# 压缩包超过该大小后写入磁盘临时文件
+SPOOL_MAX_MEMORY = 32 * 1024 * 1024
+# 小于该大小的文本直接在当前线程压缩，大文本交给线程池并行压缩
+PARALLEL_MIN_BYTES = 256 * 1024
+COMPRESS_WORKERS = min(4, os.cpu_count() or 1)
+COMPRESS_LEVEL = 6
+COPY_CHUNK_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+_raw_write_checked = None  # 写入已压缩数据的方式是否可用，首次使用时检查
+
+
+def _get_executor():
+    """共享压缩线程池（zlib压缩时释放GIL，线程即可并行）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=COMPRESS_WORKERS, thread_name_prefix="cdl-deflate")
+        return _executor
+
+
+def is_stored(arcname: str) -> bool:
+    """按扩展名判断条目是否直接存储"""
+    return posixpath.splitext(arcname)[1].lower() in STORED_EXTENSIONS
+
+
+def _deflate(data: bytes):
+    """计算CRC并以raw deflate压缩，返回 (crc, 压缩后数据)"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    return zlib.crc32(data), compressor.compress(data) + compressor.flush()
+
+
+class ResultArchive:
+    """结果压缩包：已压缩格式直接存储，文本输出在线程池中并行压缩，内容溢出到磁盘临时文件
+    
+    用法与zipfile.ZipFile写模式一致（writestr/open），关闭后通过getvalue读取；传入file时直接写入该文件对象
+    """
+    
+    def __init__(self, file=None, max_pending: int = COMPRESS_WORKERS * 2):
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) if file is None else file
+        self._zip = zipfile.ZipFile(self.file, 'w', zipfile.ZIP_DEFLATED)
+        self._pending = deque()  # 按写入顺序排列的 (ZipInfo, 压缩结果future)
+        self._max_pending = max_pending
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def writestr(self, arcname: str, data):
+        """写入条目：文本类输出压缩（大文本异步并行），已压缩格式直接存储"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        zinfo = zipfile.ZipInfo(arcname, time.localtime(time.time())[:6])
+        zinfo.external_attr = 0o600 << 16
+        if is_stored(arcname):
+            zinfo.compress_type = zipfile.ZIP_STORED
+            self._flush_pending(wait_all=True)  # 先写入之前提交的条目，保持写入顺序
+            self._zip.writestr(zinfo, data)
+            return
+        
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        if not _raw_write_supported():
+            # 当前Python版本的zipfile不支持写入已压缩数据，在当前线程压缩
+            self._zip.writestr(zinfo, data)
+            return
+        zinfo.file_size = len(data)
+        if len(data) < PARALLEL_MIN_BYTES and not self._pending:
+            self._write_compressed(zinfo, *_deflate(data))
+            return
+        
+        self._pending.append((zinfo, _get_executor().submit(_deflate, data)))
+        self._flush_pending(block=len(self._pending) > self._max_pending)
+    
+    def open(self, arcname: str, mode: str = 'w'):
+        """打开条目用于流式写入（内容在当前线程压缩）"""
+        self._flush_pending(wait_all=True)
+        zinfo = zipfile.ZipInfo(arcname, time.localtime(time.time())[:6])
+        zinfo.external_attr = 0o600 << 16
+        zinfo.compress_type = zipfile.ZIP_STORED if is_stored(arcname) else zipfile.ZIP_DEFLATED
+        return self._zip.open(zinfo, mode)
+    
+    def close(self):
+        """写入所有待压缩条目并写出中央目录"""
+        if self._zip.fp is not None:
+            self._flush_pending(wait_all=True)
+            self._zip.close()
+    
+    def getvalue(self) -> bytes:
+        """读取完整压缩包内容"""
+        self.close()
+        self.file.seek(0)
+        return self.file.read()
+    
+    def copy_to(self, dest):
+        """把完整压缩包分块复制到文件对象"""
+        self.close()
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, dest, COPY_CHUNK_SIZE)
+    
+    @property
+    def size(self) -> int:
+        self.close()
+        self.file.seek(0, os.SEEK_END)
+        return self.file.tell()
+    
+    def _flush_pending(self, block: bool = False, wait_all: bool = False):
+        """按写入顺序落盘已完成压缩的条目；block时至少等待一个，wait_all时全部等待"""
+        while self._pending:
+            zinfo, future = self._pending[0]
+            if not (future.done() or wait_all or block):
+                break
+            self._pending.popleft()
+            self._write_compressed(zinfo, *future.result())
+            block = False
+    
+    def _write_compressed(self, zinfo, crc, compressed):
+        _write_raw(self._zip, zinfo, crc, compressed)
+
+
+def _write_raw(zf, zinfo, crc, compressed):
+    """把已压缩好的数据作为条目写入，等同于zipfile内部的写入流程（依赖zipfile的内部属性，由_raw_write_supported检查）"""
+    zinfo.CRC = crc
+    zinfo.compress_size = len(compressed)
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    with zf._lock:
+        if zf._writing:
+            raise ValueError("Can't write to ZIP archive while an open writing handle exists")
+        zf._writecheck(zinfo)
+        zf._didModify = True
+        zinfo.header_offset = zf.fp.tell()
+        zf.fp.write(zinfo.FileHeader(zip64))
+        zf.fp.write(compressed)
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+        zf.start_dir = zf.fp.tell()
+
+
+def _raw_write_supported() -> bool:
+    """首次使用时用_write_raw写一个小压缩包并用zipfile读回校验，zipfile内部实现变化时改为普通写入"""
+    global _raw_write_checked
+    if _raw_write_checked is None:
+        data = b"cdl raw write check\n" * 64
+        try:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w') as zf:
+                zinfo = zipfile.ZipInfo("check.txt", (2020, 1, 1, 0, 0, 0))
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                zinfo.file_size = len(data)
+                _write_raw(zf, zinfo, *_deflate(data))
+                zf.writestr("after.txt", b"ok")
+            with zipfile.ZipFile(buffer) as zf:
+                _raw_write_checked = zf.namelist() == ["check.txt", "after.txt"] and zf.read("check.txt") == data \
+                                     and zf.read("after.txt") == b"ok"
+        except Exception:
+            _raw_write_checked = False
+    return _raw_write_checked
@@ -0,0 +1,246 @@
+import math
+import re
+from common.process_pool import MAX_WORKERS, submit_ordered
+
+
+# 超过该页数的PDF才拆分页码范围并行转换，小文件直接整体转换
+PARALLEL_MIN_PAGES = 40
+MIN_CHUNK_PAGES = 10
+
+# 转换模式：auto按页自动选择，full全部走完整版面分析，fast全部走快速文本提取
+CONVERT_MODES = ('auto', 'full', 'fast')
+# 快速路径页面判定：矢量图形数量上限（少量分隔线/下划线不影响）
+SIMPLE_MAX_DRAWINGS = 5
+
+# 预检时最多抽样的页数，以及单页转换耗时的经验值（秒）
+TRIAGE_SAMPLE_PAGES = 20
+FAST_PAGE_SECONDS = 0.01
+FULL_PAGE_SECONDS = 0.25
+# 抽样页中无文字层的比例超过该值时视为扫描件
+SCANNED_RATIO = 0.5
+
+
+def open_pdf(pdf_content: bytes):
+    """从内存打开PDF（PyMuPDF流文档），不经过临时文件"""
+    import pymupdf
+    return pymupdf.open(stream=pdf_content, filetype='pdf')
+
+
+def convert_pdf_to_markdown(pdf_content: bytes, mode: str = 'auto', page_range: str = '', **engine_options) -> str:
+    """PDF转Markdown，返回完整文本，参数见iter_pdf_markdown"""
+    return "".join(text for _, _, text in iter_pdf_markdown(pdf_content, mode, page_range, **engine_options))
+
+
+def iter_pdf_markdown(pdf_content: bytes, mode: str = 'auto', page_range: str = '', **engine_options):
+    """逐页转换PDF为Markdown，按页序产出 (已完成页数, 总页数, 该页Markdown)
+    
+    纯文本页走快速路径，其余页走完整分析；大文件按页码范围拆分到进程池并行，再按页序依次产出。
+    page_range为页码范围（如"1-20, 25"，留空为全部页），engine_options见convert_pages
+    """
+    if mode not in CONVERT_MODES:
+        raise ValueError(f"未知的转换模式: {mode}")
+    
+    with open_pdf(pdf_content) as doc:
+        pages = parse_page_range(page_range, doc.page_count)
+        hdr_info = _identify_headers(doc, pages, mode, engine_options)
+        total = len(pages)
+        if total < PARALLEL_MIN_PAGES:
+            for done, text in enumerate(convert_pages(doc, pages, hdr_info, mode, **engine_options), 1):
+                yield done, total, text
+            return
+    
+    # 每个页码范围把文件内容传给子进程，在途数量限制为进程数，控制内存中的副本数
+    args_list = ((pdf_content, chunk, hdr_info, mode, engine_options) for chunk in _split_pages(pages))
+    futures = submit_ordered(_convert_page_range, args_list, max_pending=MAX_WORKERS)
+    done = 0
+    for future in futures:
+        for text in future.result():
+            done += 1
+            yield done, total, text
+
+
+def triage_pdf(pdf_content: bytes) -> dict:
+    """快速预检PDF（只读元数据和抽样页的文字/图片信息，不渲染）
+    
+    返回页数、是否加密、有文字层/含图片/纯文本页的抽样比例、是否疑似扫描件
+    """
+    with open_pdf(pdf_content) as doc:
+        info = {'page_count': doc.page_count, 'encrypted': bool(doc.needs_pass)}
+        if doc.needs_pass or not doc.page_count:
+            return {**info, 'text_ratio': 0.0, 'image_ratio': 0.0, 'simple_ratio': 0.0, 'scanned': False}
+        
+        # 均匀抽样，避免超大文件逐页检查
+        step = max(1, doc.page_count // TRIAGE_SAMPLE_PAGES)
+        samples = [doc[pno] for pno in range(0, doc.page_count, step)][:TRIAGE_SAMPLE_PAGES]
+        text_pages = sum(1 for page in samples if page.get_text("text").strip())
+        image_pages = sum(1 for page in samples if page.get_images(full=False))
+        simple_pages = sum(1 for page in samples if is_simple_text_page(page))
+    
+    text_ratio = text_pages / len(samples)
+    return {
+        **info,
+        'text_ratio': text_ratio,
+        'image_ratio': image_pages / len(samples),
+        'simple_ratio': simple_pages / len(samples),
+        'scanned': 1 - text_ratio > SCANNED_RATIO,
+    }
+
+
+def estimate_convert_seconds(triage: dict, mode: str = 'auto', page_count: int = None) -> float:
+    """按预检结果估算转换耗时，page_count为实际转换的页数（默认全部页）"""
+    if triage['encrypted']:
+        return 0.0
+    pages = triage['page_count'] if page_count is None else page_count
+    if mode == 'fast':
+        per_page = FAST_PAGE_SECONDS
+    elif mode == 'full':
+        per_page = FULL_PAGE_SECONDS
+    else:
+        per_page = triage['simple_ratio'] * FAST_PAGE_SECONDS + (1 - triage['simple_ratio']) * FULL_PAGE_SECONDS
+    seconds = pages * per_page
+    if pages >= PARALLEL_MIN_PAGES:
+        seconds /= min(MAX_WORKERS, len(_split_pages(range(pages))))
+    return seconds
+
+
+def parse_page_spans(page_range: str) -> list:
+    """只校验页码范围格式，不展开页码：返回 [(起始页, 结束页)]（1-based，结束页为None表示到最后一页），留空返回空列表"""
+    if not page_range or not page_range.strip():
+        return []
+    
+    spans = []
+    for part in re.split(r'[,，]', page_range):
+        match = re.fullmatch(r'\s*(\d+)\s*(?:(-)\s*(\d*)\s*)?', part)
+        if not match:
+            raise ValueError(f"页码范围格式错误: {part.strip()}")
+        start = int(match.group(1))
+        end = int(match.group(3)) if match.group(3) else (None if match.group(2) else start)
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"页码范围格式错误: {part.strip()}")
+        spans.append((start, end))
+    return spans
+
+
+def parse_page_range(page_range: str, page_count: int) -> list:
+    """解析页码范围（1-based，如"1-20, 25, 30-"），返回0-based页码列表，留空表示全部页"""
+    spans = parse_page_spans(page_range)
+    if not spans:
+        return list(range(page_count))
+    
+    pages = set()
+    for start, end in spans:
+        pages.update(range(start - 1, min(page_count if end is None else end, page_count)))
+    if not pages:
+        raise ValueError("页码范围超出文档页数")
+    return sorted(pages)
+
+
+def convert_pages(doc, pages, hdr_info=None, mode='auto', ignore_images=False, ignore_graphics=False, detect_tables=True):
+    """按页序逐页转换指定页，产出每页的Markdown
+    
+    ignore_images/ignore_graphics：跳过图片/矢量图形，detect_tables=False：跳过表格识别
+    """
+    import pymupdf4llm
+    
+    to_markdown = pymupdf4llm.to_markdown
+    kwargs = {}
+    if ignore_images or ignore_graphics or not detect_tables:
+        # layout引擎不支持这些选项，统一使用支持跳过图片/图形/表格的经典引擎
+        from pymupdf4llm.helpers.pymupdf_rag import to_markdown
+        kwargs = {
+            'ignore_images': ignore_images,
+            'ignore_graphics': ignore_graphics,
+            'table_strategy': 'lines_strict' if detect_tables else None,
+            'hdr_info': hdr_info,
+        }
+    elif hdr_info is not None and _is_legacy_engine():
+        kwargs['hdr_info'] = hdr_info
+    
+    for pno in pages:
+        page = doc[pno]
+        if mode == 'fast' or (mode == 'auto' and is_simple_text_page(page, ignore_images, ignore_graphics or not detect_tables)):
+            yield fast_page_to_markdown(page, hdr_info)
+        else:
+            # 单页调用与整体调用结果一致，额外开销可忽略
+            yield to_markdown(doc, pages=[pno], page_chunks=True, **kwargs)[0]['text']
+
+
+def is_simple_text_page(page, ignore_images=False, ignore_drawings=False) -> bool:
+    """判断是否为纯文本页：有文字层、无图片、几乎无矢量图形（表格线）、单栏排版
+    
+    跳过图片/矢量图形（或表格识别）时，对应的内容不再影响判定
+    """
+    if not ignore_images and page.get_images(full=False):
+        return False
+    if not ignore_drawings and len(page.get_cdrawings()) > SIMPLE_MAX_DRAWINGS:
+        return False
+    
+    blocks = [b for b in page.get_text("blocks") if b[6] == 0 and b[4].strip()]
+    if not blocks:
+        return False  # 无文字层（扫描件等）交给完整分析
+    
+    # 左右两半都存在窄文本块且纵向重叠，视为多栏排版
+    middle = page.rect.width / 2
+    left = [b for b in blocks if b[2] <= middle]
+    right = [b for b in blocks if b[0] >= middle]
+    return not any(l[1] < r[3] and r[1] < l[3] for l in left for r in right)
+
+
+def fast_page_to_markdown(page, hdr_info=None) -> str:
+    """快速路径：直接按文本块提取，字号映射为标题级别，保留粗体/斜体"""
+    import pymupdf
+    
+    output = []
+    for block in page.get_text("dict", flags=pymupdf.TEXTFLAGS_TEXT)["blocks"]:
+        lines = []
+        prefix = ""
+        for line in block.get("lines", []):
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            if not lines and hdr_info is not None:
+                prefix = hdr_info.get_header_id(spans[0], page=page)
+            lines.append("".join(_format_span(span, bool(prefix)) for span in spans).strip())
+        if lines:
+            output.append(prefix + " ".join(lines) + "\n\n")
+    return "".join(output)
+
+
+def _format_span(span, is_header):
+    text = span["text"]
+    if is_header or not text.strip():
+        return text
+    stripped = text.strip()
+    if span["flags"] & 16:  # 粗体
+        stripped = f"**{stripped}**"
+    if span["flags"] & 2:   # 斜体
+        stripped = f"_{stripped}_"
+    return text.replace(text.strip(), stripped, 1)
+
+
+def _identify_headers(doc, pages, mode, engine_options):
+    """按所选页的字号统计标题级别，统一计算一次后分发，保证各页码范围与整体转换结果一致"""
+    uses_legacy = _is_legacy_engine() or any(engine_options.get(k) for k in ('ignore_images', 'ignore_graphics')) \
+        or not engine_options.get('detect_tables', True)
+    if mode == 'full' and not uses_legacy:
+        return None
+    from pymupdf4llm.helpers.pymupdf_rag import IdentifyHeaders
+    return IdentifyHeaders(doc, pages=pages)
+
+
+def _is_legacy_engine():
+    """旧版引擎（非layout）才接受外部传入的标题信息"""
+    import pymupdf4llm
+    return hasattr(pymupdf4llm, 'IdentifyHeaders')
+
+
+def _split_pages(pages):
+    """把页码列表切分为若干段，段数约为进程数的2倍以均衡负载"""
+    chunk_size = max(MIN_CHUNK_PAGES, math.ceil(len(pages) / (MAX_WORKERS * 2)))
+    return [pages[start:start + chunk_size] for start in range(0, len(pages), chunk_size)]
+
+
+def _convert_page_range(pdf_content, pages, hdr_info=None, mode='auto', engine_options=None):
+    """子进程中转换指定页码范围，返回各页Markdown列表"""
+    with open_pdf(pdf_content) as doc:
+        return list(convert_pages(doc, pages, hdr_info, mode, **(engine_options or {})))
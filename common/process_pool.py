@@ -0,0 +1,62 @@
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+
+# 进程数可通过环境变量配置，默认使用全部CPU核心
+MAX_WORKERS = int(os.environ.get("CDL_PROCESS_WORKERS", 0)) or os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """获取全局共享进程池（懒加载，损坏后自动重建）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or getattr(_pool, '_broken', False):
+            # spawn方式启动子进程，避免在多线程的Streamlit进程中fork
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def submit_ordered(fn, args_list, max_pending=None):
+    """按提交顺序逐个产出已完成的future，同时限制在途任务数，避免一次性堆积全部输入"""
+    if multiprocessing.parent_process() is not None:
+        # 已在进程池的子进程中（如命令行批处理），直接顺序执行，不再嵌套创建进程池
+        yield from _run_inline(fn, args_list)
+        return
+    
+    pool = get_process_pool()
+    max_pending = max_pending or MAX_WORKERS * 2
+    pending = deque()
+    
+    try:
+        for args in args_list:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= max_pending:
+                future = pending.popleft()
+                future.exception()  # 等待完成
+                yield future
+        
+        while pending:
+            future = pending.popleft()
+            future.exception()
+            yield future
+    finally:
+        # 调用方提前停止（如任务取消）时，撤回尚未开始执行的子任务
+        for future in pending:
+            future.cancel()
+
+
+def _run_inline(fn, args_list):
+    """在当前进程中逐个执行，产出与进程池一致的future"""
+    for args in args_list:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        yield future
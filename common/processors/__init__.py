@@ -0,0 +1,60 @@
+"""各工具的处理函数（不依赖streamlit），页面与命令行批处理共用"""
+
+# 工具名 -> (说明, 输入扩展名, 命令行批处理时每个子任务的文件数)
+TOOLS = {
+    'xls-to-xlsx': ("XLS转XLSX", ('.xls',), 50),
+    'excel-split': ("Excel-Sheet拆分", ('.xlsx',), 20),
+    'excel-title': ("Excel标题与表头清洗", ('.xlsx',), 20),
+    'doc-to-docx': ("DOC转DOCX", ('.doc',), 50),
+    'word-to-pdf': ("Word转PDF", ('.doc', '.docx'), 50),
+    'word-clean': ("DOCX页眉页脚清理", ('.docx',), 20),
+    'pdf-markdown': ("PDF转Markdown", ('.pdf',), 5),
+}
+
+# 各工具的处理选项及默认值（与页面默认值一致）
+DEFAULT_OPTIONS = {
+    'excel-title': {'title_check_rows': 3, 'max_value_cols': 2, 'header_rows': 2, 'compact': False, 'merge_format': ''},
+    'word-clean': {'remove_headers': True, 'remove_footers': True, 'remove_comments': False,
+                   'accept_revisions': False, 'remove_hidden_text': False, 'remove_properties': False},
+    'pdf-markdown': {'mode': 'auto', 'page_range': '', 'ignore_images': False, 'ignore_graphics': False, 'detect_tables': True},
+}
+
+# LibreOffice转换工具 -> (源扩展名, 目标扩展名)，与页面提交给LibreOffice队列的参数一致
+LIBREOFFICE_TOOLS = {
+    'xls-to-xlsx': ('xls', 'xlsx'),
+    'doc-to-docx': ('doc', 'docx'),
+    'word-to-pdf': ('docx', 'pdf'),
+}
+
+
+def run_tool(tool: str, files: list, writer, options: dict = None) -> list:
+    """对一组文件（带name/getvalue的文件引用）运行指定工具，输出写入writer，返回处理结果行（最后一列为状态）"""
+    options = {**DEFAULT_OPTIONS.get(tool, {}), **(options or {})}
+    if tool in LIBREOFFICE_TOOLS:
+        from common.processors.libreoffice import process_files_batch
+        _, results = process_files_batch([(f.name, f) for f in files], *LIBREOFFICE_TOOLS[tool], writer=writer)
+    elif tool == 'excel-split':
+        from common.processors.excel_split import process_files_batch
+        _, results = process_files_batch([(f, f.name) for f in files], writer)
+    elif tool == 'excel-title':
+        from common.processors.excel_title import process_files_batch
+        params = (options['title_check_rows'], options['max_value_cols'], options['header_rows'],
+                  options['compact'], options['merge_format'])
+        _, results = process_files_batch([(f, f.name, *params) for f in files], writer)
+    elif tool == 'word-clean':
+        from common.processors.word_clean import process_files_batch
+        _, results = process_files_batch([(f.name, f, options) for f in files], writer)
+    elif tool == 'pdf-markdown':
+        from common.processors.pdf_markdown import process_files_batch
+        _, results = process_files_batch([(f.name, f, options) for f in files], writer)
+    else:
+        raise ValueError(f"未知工具: {tool}")
+    return results
+
+
+def run_tool_to_directory(tool: str, files: list, out_dir: str, options: dict = None) -> list:
+    """运行工具并把输出直接写到目录（命令行批处理在进程池中调用）"""
+    from common.result_store import DirectoryWriter
+    
+    with DirectoryWriter(out_dir) as writer:
+        return run_tool(tool, files, writer, options)
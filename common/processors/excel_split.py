@@ -0,0 +1,70 @@
+import io
+import shutil
+import tempfile
+from pathlib import Path
+from openpyxl import load_workbook
+from common.file_processing_queue import fp_queue
+from common.result_store import ResultWriter
+from common.archive_input import output_stem
+
+
+def split_excel_file(file_data, file_name, zip_writer=None):
+    """核心拆分函数：使用文件复制方式完整保留所有样式"""
+    base_name = output_stem(file_name)
+    
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as temp_file:
+        temp_file.write(file_data.getvalue())
+        temp_path = temp_file.name
+    
+    try:
+        workbook = load_workbook(temp_path, data_only=True)
+        sheet_names = workbook.sheetnames
+        workbook.close()
+        
+        # 如果只是获取sheet信息，直接返回
+        if zip_writer is None:
+            return len(sheet_names)
+        
+        if len(sheet_names) == 1:
+            return 0  # 跳过单sheet文件
+        
+        # 为每个sheet创建独立文件
+        for sheet_name in sheet_names:
+            with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as target_temp:
+                shutil.copy2(temp_path, target_temp.name)
+                
+                wb = load_workbook(target_temp.name)
+                for remove_name in [n for n in wb.sheetnames if n != sheet_name]:
+                    wb.remove(wb[remove_name])
+                
+                excel_buffer = io.BytesIO()
+                wb.save(excel_buffer)
+                wb.close()
+                
+                zip_writer.writestr(f"{base_name}-{sheet_name}.xlsx", excel_buffer.getvalue())
+        
+        return len(sheet_names)  # 返回处理的sheet数量
+    
+    finally:
+        Path(temp_path).unlink(missing_ok=True)
+
+
+
+
+def process_files_batch(files_data, writer=None):
+    """批处理文件并返回结果"""
+    results = []
+    
+    with (writer or ResultWriter()) as writer:
+        for file_data, file_name in files_data:
+            fp_queue.check_cancelled()
+            try:
+                sheet_count = split_excel_file(file_data, file_name, writer)
+                if sheet_count == 0:
+                    results.append([file_name, 1, '⏩ 已跳过(单sheet)'])
+                else:
+                    results.append([file_name, sheet_count, f'✅ 已拆分({sheet_count}个sheet)'])
+            except Exception as e:
+                results.append([file_name, 0, f'❌ {str(e)[:15]}...'])
+    
+    return writer, results
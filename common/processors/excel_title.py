@@ -0,0 +1,297 @@
+import io
+import shutil
+import numbers
+import tempfile
+import pandas as pd
+from common.file_processing_queue import fp_queue
+from common.result_store import ResultWriter
+from common.archive_input import output_stem
+
+
+def excel_col_to_index(col_str):
+    """Excel列名转索引 A->0, B->1"""
+    result = 0
+    for char in col_str.upper():
+        result = result * 26 + (ord(char) - ord('A') + 1)
+    return result - 1
+
+def index_to_excel_col(index):
+    """索引转Excel列名 0->A, 1->B"""
+    result = ""
+    while index >= 0:
+        result = chr(index % 26 + ord('A')) + result
+        index = index // 26 - 1
+    return result
+
+def detect_data_boundary(df):
+    """检测数据边界"""
+    start_col = 0
+    end_col = df.shape[1] - 1
+    body_end_row = df.shape[0]
+    return start_col, end_col, body_end_row
+
+
+def clean_excel_data(df, start_col, end_col, body_end_row, title_check_rows=3, max_value_cols=2, header_rows=2):
+    """清洗指定区域的Excel数据"""
+    # 选择指定区域
+    selected_df = df.iloc[:body_end_row, start_col:end_col+1].copy()
+    
+    # 删除标题行
+    removed_title_rows = 0
+    for i in range(min(title_check_rows, len(selected_df))):
+        if selected_df.iloc[i].notna().sum() <= max_value_cols:
+            removed_title_rows += 1
+        else:
+            break
+    
+    if removed_title_rows > 0:
+        selected_df = selected_df.drop(selected_df.index[:removed_title_rows]).reset_index(drop=True)
+    
+    # 处理表头
+    if len(selected_df) >= header_rows:
+        header_data = [selected_df.iloc[i].ffill() for i in range(header_rows)]
+        new_headers = []
+        for col_idx in range(len(selected_df.columns)):
+            parts = [str(header_data[i].iloc[col_idx]) for i in range(header_rows) 
+                    if pd.notna(header_data[i].iloc[col_idx]) and str(header_data[i].iloc[col_idx])]
+            unique_parts = list(dict.fromkeys(parts))
+            new_headers.append("-".join(unique_parts) if unique_parts else f"Col_{col_idx}")
+        
+        selected_df = selected_df.iloc[header_rows:].copy()
+        if not selected_df.empty:
+            selected_df.columns = new_headers[:len(selected_df.columns)]
+    
+    # 填充左侧合并单元格
+    for col_idx in range(len(selected_df.columns)):
+        col_data = selected_df.iloc[:, col_idx]
+        if col_data.isna().any() and col_data.count() > 0:
+            non_null_ratio = col_data.count() / len(col_data)
+            if non_null_ratio < 0.8 or (col_idx == 0 and pd.notna(col_data.iloc[0])):
+                selected_df.iloc[:, col_idx] = col_data.ffill()
+        elif col_idx > 0 and col_data.count() == len(col_data):
+            break
+    
+    return selected_df
+
+
+def compact_dtypes(df, category_ratio=0.5, numeric_ratio=0.95):
+    """压缩数据类型：低基数列转分类，数值列降位，文本列使用Arrow字符串
+    
+    数值占非空单元格numeric_ratio以上、夹杂少量文字（如"无"、"-"）的列按数值列压缩，其中的文字视为缺失值
+    """
+    try:
+        import pyarrow  # noqa: F401
+        string_dtype = pd.StringDtype("pyarrow")
+    except ImportError:
+        string_dtype = None
+    
+    for col_idx in range(df.shape[1]):
+        col_data = df.iloc[:, col_idx]
+        # 空白单元格视为缺失值，避免数值列因空字符串停留在object类型
+        if col_data.dtype == object:
+            col_data = col_data.mask(col_data.map(lambda v: isinstance(v, str) and not v.strip()))
+        kind = pd.api.types.infer_dtype(col_data, skipna=True)
+        
+        if kind == 'integer':
+            # 含缺失值时使用可空整数，避免整数列变成浮点
+            if col_data.isna().any():
+                col_data = pd.to_numeric(col_data, downcast='integer', dtype_backend='numpy_nullable')
+            else:
+                col_data = pd.to_numeric(col_data, downcast='integer')
+        elif kind in ('floating', 'mixed-integer-float'):
+            col_data = pd.to_numeric(col_data)
+        elif kind in ('mixed', 'mixed-integer'):
+            non_null = col_data.count()
+            # 只统计非空单元格（NaN也是numbers.Real，不能算作数值）
+            numeric = col_data.dropna().map(lambda v: isinstance(v, numbers.Real) and not isinstance(v, bool)).sum()
+            if not non_null or numeric / non_null < numeric_ratio:
+                continue
+            col_data = pd.to_numeric(col_data, errors='coerce')
+            if col_data.dropna().mod(1).eq(0).all():
+                col_data = pd.to_numeric(col_data.astype('Int64'), downcast='integer')
+        elif kind == 'string':
+            non_null = col_data.count()
+            if non_null and col_data.nunique() / non_null <= category_ratio:
+                col_data = col_data.astype('category')
+            elif string_dtype is not None:
+                col_data = col_data.astype(string_dtype)
+        else:
+            continue
+        df.isetitem(col_idx, col_data)
+    
+    return df
+
+class MergedDatasetWriter:
+    """合并数据集：清洗结果逐个落盘，最后按统一表头流式追加写出CSV/Parquet"""
+    SOURCE_COLUMN = "来源文件"
+    
+    def __init__(self, merge_format):
+        self.merge_format = merge_format
+        self.temp_dir = tempfile.mkdtemp()
+        self.parts = []          # (落盘路径, 来源文件名)
+        self.columns = []        # 统一表头，按首次出现顺序
+        self.column_kinds = {}   # 列名 -> 各文件推断出的类型集合
+        self.row_count = 0
+    
+    def add(self, df, source_name):
+        """暂存一个清洗结果，同时累积统一表头"""
+        df = df.copy(deep=False)
+        df.columns = self._unique_columns(df.columns)
+        
+        for col in df.columns:
+            if col not in self.column_kinds:
+                self.columns.append(col)
+                self.column_kinds[col] = set()
+            self.column_kinds[col].add(self._infer_kind(df[col]))
+        
+        path = f"{self.temp_dir}/part_{len(self.parts)}.pkl"
+        df.to_pickle(path)
+        self.parts.append((path, source_name))
+        self.row_count += len(df)
+    
+    def write_to(self, zip_writer, arcname):
+        """按统一表头逐个读回暂存结果，流式追加写入zip"""
+        if self.merge_format == 'parquet':
+            parquet_path = f"{self.temp_dir}/merged.parquet"
+            self._write_parquet(parquet_path)
+            with open(parquet_path, 'rb') as src, zip_writer.open(arcname, 'w') as dest:
+                shutil.copyfileobj(src, dest, 1024 * 1024)
+        else:
+            with zip_writer.open(arcname, 'w') as dest:
+                text_stream = io.TextIOWrapper(dest, encoding='utf-8-sig', newline='')
+                for i, df in enumerate(self._iter_aligned()):
+                    df.to_csv(text_stream, index=False, header=(i == 0))
+                text_stream.flush()
+                text_stream.detach()
+    
+    def close(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _iter_aligned(self):
+        for path, source_name in self.parts:
+            df = pd.read_pickle(path).reindex(columns=self.columns)
+            df.insert(0, self.SOURCE_COLUMN, source_name)
+            yield df
+    
+    def _write_parquet(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        kind_types = {'integer': pa.int64(), 'floating': pa.float64(), 'boolean': pa.bool_(), 'datetime': pa.timestamp('us')}
+        fields = [pa.field(self.SOURCE_COLUMN, pa.string())]
+        for col in self.columns:
+            kinds = self.column_kinds[col] - {'empty'}
+            if kinds == {'integer', 'floating'}:
+                kinds = {'floating'}
+            arrow_type = kind_types.get(kinds.pop(), pa.string()) if len(kinds) == 1 else pa.string()
+            fields.append(pa.field(col, arrow_type))
+        schema = pa.schema(fields)
+        
+        with pq.ParquetWriter(path, schema) as writer:
+            for df in self._iter_aligned():
+                arrays = [self._to_arrow(df.iloc[:, i], field.type) for i, field in enumerate(schema)]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    
+    def _unique_columns(self, columns):
+        """列名转字符串并去重，保留来源文件列名"""
+        seen = {self.SOURCE_COLUMN}
+        result = []
+        for col in columns:
+            name, n = str(col), 1
+            while name in seen:
+                name = f"{col}_{n}"
+                n += 1
+            seen.add(name)
+            result.append(name)
+        return result
+    
+    @staticmethod
+    def _infer_kind(series):
+        """推断列的合并类型：integer/floating/boolean/datetime/string/empty"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.cat.categories.to_series()
+        kind = pd.api.types.infer_dtype(series, skipna=True)
+        if kind == 'mixed-integer-float':
+            return 'floating'
+        if kind in ('datetime64', 'datetime'):
+            return 'datetime'
+        return kind if kind in ('integer', 'floating', 'boolean', 'empty') else 'string'
+    
+    @staticmethod
+    def _to_arrow(series, arrow_type):
+        import pyarrow as pa
+        
+        if pa.types.is_string(arrow_type):
+            return pa.array([None if pd.isna(v) else str(v) for v in series], type=arrow_type)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(object)
+        if pa.types.is_timestamp(arrow_type):
+            series = pd.to_datetime(series, errors='coerce')
+        elif not pa.types.is_boolean(arrow_type):
+            series = pd.to_numeric(series, errors='coerce')
+        return pa.array(series, from_pandas=True).cast(arrow_type)
+
+
+def clean_excel_file(file_data, file_name, zip_writer, title_check_rows=3, max_value_cols=2, header_rows=2, compact=False, merged_writer=None):
+    """清洗Excel文件并添加到zip；指定merged_writer时只暂存到合并数据集"""
+    df = pd.read_excel(io.BytesIO(file_data.getvalue()), header=None)
+    start_col, end_col, body_end_row = detect_data_boundary(df)
+    cleaned_df = clean_excel_data(df, start_col, end_col, body_end_row, title_check_rows, max_value_cols, header_rows)
+    if compact:
+        cleaned_df = compact_dtypes(cleaned_df)
+    
+    if merged_writer is not None:
+        merged_writer.add(cleaned_df, file_name)
+    else:
+        # 生成文件
+        base_name = output_stem(file_name)
+        
+        # Excel文件
+        excel_buffer = io.BytesIO()
+        cleaned_df.to_excel(excel_buffer, index=False)
+        zip_writer.writestr(f"excel/{base_name}_clean.xlsx", excel_buffer.getvalue())
+        
+        # JSON文件
+        json_data = cleaned_df.to_json(orient='records', force_ascii=False, indent=2)
+        zip_writer.writestr(f"json/{base_name}_clean.json", json_data)
+    
+    # 返回处理信息
+    boundary_info = f"{index_to_excel_col(start_col)}-{index_to_excel_col(end_col)}列,{body_end_row}行"
+    return boundary_info, df.shape[0], cleaned_df.shape[0]
+
+
+def process_files_batch(files_data, writer=None):
+    """批处理文件并返回结果"""
+    # 从第一个元素提取参数
+    _, _, title_check_rows, max_value_cols, header_rows, compact, merge_format = files_data[0]
+    # 提取文件数据
+    files_data = [(f, n) for f, n, *_ in files_data]
+    
+    results = []
+    merged_writer = MergedDatasetWriter(merge_format) if merge_format else None
+    
+    try:
+        with (writer or ResultWriter()) as writer:
+            for file_data, file_name in files_data:
+                fp_queue.check_cancelled()
+                try:
+                    boundary_info, original_rows, final_rows = clean_excel_file(
+                        file_data, file_name, writer, title_check_rows, max_value_cols, header_rows, compact, merged_writer
+                    )
+                    results.append([file_name, boundary_info, original_rows, final_rows, "✅ 成功"])
+                except Exception as e:
+                    results.append([file_name, "处理失败", 0, 0, f"❌ {str(e)[:15]}..."])
+            
+            # 合并数据集
+            if merged_writer and merged_writer.parts:
+                merged_name = f"merged/merged_clean.{merge_format}"
+                try:
+                    merged_writer.write_to(writer, merged_name)
+                    results.append([merged_name, f"{len(merged_writer.parts)}个文件", 0, merged_writer.row_count, "📦 已合并"])
+                except Exception as e:
+                    results.append([merged_name, "合并失败", 0, 0, f"❌ {str(e)[:15]}..."])
+    finally:
+        if merged_writer:
+            merged_writer.close()
+    
+    return writer, results
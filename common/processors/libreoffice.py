@@ -0,0 +1,151 @@
+import os
+import time
+import atexit
+import signal
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+from common.libreoffice_path import get_libreoffice_path
+from common.result_store import ResultWriter
+from common.archive_input import output_stem
+
+
+# 每次调用LibreOffice转换的文件数，超大批次分组转换，避免单次调用超时
+LO_BATCH_SIZE = 50
+LO_TIMEOUT = 120
+# 转换进行中检查取消的间隔（秒）
+LO_POLL_INTERVAL = 0.5
+# 各进程LibreOffice用户配置目录的名称前缀（后接进程ID）
+PROFILE_PREFIX = "cdl_lo_profile_"
+
+_profile_dir = None
+
+
+def convert_batch(files_data, source_ext, target_ext, should_stop=None):
+    """批量转换文件，按LO_BATCH_SIZE分组调用LibreOffice，返回 [(文件名, 内容, 错误信息)]
+    
+    should_stop返回True时（任务已取消）结束正在运行的LibreOffice进程，不再转换后续分组
+    """
+    results = []
+    for start in range(0, len(files_data), LO_BATCH_SIZE):
+        if should_stop and should_stop():
+            break
+        results.extend(convert_group(files_data[start:start + LO_BATCH_SIZE], source_ext, target_ext, should_stop))
+    return results
+
+
+def convert_group(files_data, source_ext, target_ext, should_stop=None):
+    """调用一次LibreOffice转换一组文件"""
+    temp_dir = tempfile.mkdtemp()
+    results = []
+    
+    try:
+        # 写入临时文件并执行转换
+        input_paths = []
+        for i, (filename, source) in enumerate(files_data):
+            path = f"{temp_dir}/file_{i}.{source_ext}"
+            with open(path, 'wb') as f:
+                # 上传文件或压缩包内的文件在写入时才读取
+                f.write(source.getvalue() if hasattr(source, 'getvalue') else source)
+            input_paths.append((path, filename))
+        
+        libreoffice_path = get_libreoffice_path()
+        cmd = [libreoffice_path, '--headless', f'-env:UserInstallation={_profile_url()}',
+               '--convert-to', target_ext, '--outdir', temp_dir]
+        cmd.extend([path for path, _ in input_paths])
+        _run_soffice(cmd, should_stop)
+        
+        # 读取结果
+        for input_path, original_name in input_paths:
+            output_path = input_path.replace(f'.{source_ext}', f'.{target_ext}')
+            try:
+                with open(output_path, 'rb') as f:
+                    results.append((original_name, f.read(), None))
+            except Exception as e:
+                results.append((original_name, None, str(e)[:20]))
+    
+    except Exception as e:
+        results = [(filename, None, str(e)[:20]) for filename, _ in files_data]
+    
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    return results
+
+
+def _run_soffice(cmd, should_stop=None):
+    """运行LibreOffice，超时或should_stop返回True时结束整个进程组（soffice会再启动子进程）"""
+    process = subprocess.Popen(cmd, start_new_session=True)
+    deadline = time.time() + LO_TIMEOUT
+    try:
+        while True:
+            try:
+                returncode = process.wait(timeout=LO_POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if time.time() > deadline:
+                    raise subprocess.TimeoutExpired(cmd, LO_TIMEOUT)
+                if should_stop and should_stop():
+                    raise RuntimeError("已取消")
+    except BaseException:
+        _kill(process)
+        raise
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _kill(process):
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    else:
+        process.kill()
+    process.wait()
+
+
+def write_results(conversion_results, target_ext, writer=None):
+    """把转换结果写入结果文件，返回 (writer, 处理结果)"""
+    results = []
+    
+    with (writer or ResultWriter()) as writer:
+        for filename, content, error in conversion_results:
+            if content:
+                writer.writestr(f"{output_stem(filename)}.{target_ext}", content)
+                results.append([filename, '✅ 转换成功'])
+            else:
+                results.append([filename, f'❌ {error}'])
+    
+    return writer, results
+
+
+def process_files_batch(files_data, source_ext, target_ext, writer=None):
+    """转换一批文件并写入结果文件（命令行批处理使用，页面经LibreOffice队列串行转换）"""
+    return write_results(convert_batch(files_data, source_ext, target_ext), target_ext, writer)
+
+
+def _profile_url():
+    """每个进程使用独立的LibreOffice用户配置目录，多个进程同时转换时不会互相锁定；进程退出时删除"""
+    global _profile_dir
+    if _profile_dir is None:
+        _remove_stale_profiles()
+        _profile_dir = Path(tempfile.gettempdir()) / f"{PROFILE_PREFIX}{os.getpid()}"
+        atexit.register(shutil.rmtree, _profile_dir, ignore_errors=True)
+    return _profile_dir.as_uri()
+
+
+def _remove_stale_profiles():
+    """删除已退出进程留下的配置目录（进程池子进程和异常退出的进程不执行atexit）"""
+    if os.name != 'posix':
+        return
+    for path in Path(tempfile.gettempdir()).glob(f"{PROFILE_PREFIX}*"):
+        try:
+            os.kill(int(path.name[len(PROFILE_PREFIX):]), 0)
+        except ValueError:
+            continue
+        except ProcessLookupError:
+            shutil.rmtree(path, ignore_errors=True)
+        except PermissionError:
+            continue  # 进程仍在运行（属于其他用户）
@@ -0,0 +1,54 @@
+from common.file_processing_queue import fp_queue
+from common.pdf_converter import iter_pdf_markdown
+from common.result_store import ResultWriter
+from common.archive_input import output_stem
+
+
+# 转换过程中预览显示的最大字符数
+PREVIEW_CHARS = 3000
+
+def convert_pdf_to_entry_safe(writer, md_filename, source, file_name, options, results):
+    """读取PDF（上传文件或压缩包内的文件），逐页转换并流式写入结果文件，出错时保留已写入的页，返回 (已完成页数, 总页数, 错误信息)"""
+    done, total, entry, preview = 0, 0, None, ""
+    try:
+        import pymupdf4llm  # noqa: F401
+        for done, total, text in iter_pdf_markdown(source.getvalue(), **(options or {})):
+            if entry is None:
+                entry = writer.open(md_filename, 'w')
+            entry.write(text.encode('utf-8'))
+            preview = (preview + text)[-PREVIEW_CHARS:]
+            fp_queue.report_partial({'results': list(results), 'current': file_name, 'pages': (done, total), 'preview': preview})
+            fp_queue.check_cancelled()  # 每页检查，取消后未开始的页不再转换
+        return done, total, None
+    except ImportError:
+        return done, total, "缺少pymupdf4llm库"
+    except Exception as e:
+        return done, total, str(e)[:20]
+    finally:
+        if entry is not None:
+            entry.close()
+
+def process_files_batch(files_data, writer=None):
+    """批处理PDF文件：逐页转换写入结果文件，并上报已完成的文件和当前文件预览"""
+    results = []
+    total = len(files_data)
+    fp_queue.report_progress(0, total)
+    
+    with (writer or ResultWriter()) as writer:
+        for i, (file_name, source, options) in enumerate(files_data):
+            # 处理到该文件时才读取内容，转换后立即释放，避免整批文件一直占用内存
+            files_data[i] = (file_name, None, options)
+            md_filename = f"{output_stem(file_name)}.md"
+            pages_done, pages_total, error = convert_pdf_to_entry_safe(writer, md_filename, source, file_name, options, results)
+            del source
+            
+            if error is None:
+                results.append([file_name, '✅ 转换成功'])
+            elif pages_done:
+                results.append([file_name, f'⚠️ 部分完成（{pages_done}/{pages_total}页）：{error}'])
+            else:
+                results.append([file_name, f'❌ {error}'])
+            fp_queue.report_progress(i + 1, total)
+            fp_queue.report_partial({'results': list(results)})
+    
+    return writer, results
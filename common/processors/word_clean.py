@@ -0,0 +1,31 @@
+from functools import partial
+from common.file_processing_queue import fp_queue
+from common.process_pool import submit_ordered
+from common.docx_cleaner import clean_docx
+from common.result_store import ResultWriter
+from common.archive_input import output_stem
+
+
+def process_files_batch(files_data, writer=None):
+    """批处理DOCX文件：在共享进程池中逐文件并行清理，返回结果文件和处理结果"""
+    # 从第一个元素提取清理选项
+    _, _, options = files_data[0]
+    
+    results = []
+    total = len(files_data)
+    
+    with (writer or ResultWriter()) as writer:
+        # 提交到进程池时才读取文件内容，在途数量受限，不会一次读入整批文件
+        args_list = ((source.getvalue(),) for _, source, *_ in files_data)
+        for i, future in enumerate(submit_ordered(partial(clean_docx, **options), args_list)):
+            file_name = files_data[i][0]
+            try:
+                clean_filename = f"{output_stem(file_name)}_cleaned.docx"
+                writer.writestr(clean_filename, future.result())
+                results.append([file_name, '✅ 清理成功'])
+            except Exception as e:
+                results.append([file_name, f'❌ {str(e)[:50]}'])
+            fp_queue.report_progress(i + 1, total)
+            fp_queue.check_cancelled()
+    
+    return writer, results
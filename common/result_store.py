@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from pathlib import Path, PurePosixPath
+from typing import List, Optional
+
+
+# 结果目录、过期时间（秒，按最后访问时间计算）和总容量上限
+RESULT_DIR = Path(os.environ.get("CDL_RESULT_DIR") or Path(tempfile.gettempdir()) / "cdl_results")
+RESULT_TTL = int(os.environ.get("CDL_RESULT_TTL", 3600))
+RESULT_MAX_BYTES = int(os.environ.get("CDL_RESULT_MAX_MB", 2048)) * 1024 * 1024
+
+# 打包时小于该大小的文本整体读入，交给压缩线程池并行压缩；更大的文件流式压缩
+ARCHIVE_PARALLEL_MAX_BYTES = 16 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+# 过期清理的最小间隔（秒）：读取结果和任务队列的清理线程都会触发，不只在发布新结果时
+CLEANUP_INTERVAL = 60
+
+_lock = threading.Lock()
+_last_cleanup = 0.0
+
+
+class DirectoryWriter:
+    """目录写入器：输出文件直接写到指定目录，接口与zipfile写模式一致（writestr/open）"""
+    
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.names = {}  # 按写入顺序记录的文件名（dict保序，查重O(1)）
+        self.directory.mkdir(parents=True, exist_ok=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def writestr(self, arcname: str, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self.open(arcname) as dest:
+            dest.write(data)
+    
+    def open(self, arcname: str, mode: str = 'w'):
+        """打开输出文件用于写入"""
+        name = _safe_name(arcname)
+        path = self.directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.names[name] = None
+        return open(path, 'wb')
+    
+    def close(self):
+        pass
+
+
+class ResultWriter(DirectoryWriter):
+    """结果写入器：每个输出文件单独保存到结果目录
+    
+    写入过程中位于临时目录，save_result后才对外可见；打包下载时再按需组装zip
+    """
+    
+    def __init__(self):
+        self.handle = uuid.uuid4().hex
+        self.root = RESULT_DIR / f"{self.handle}.tmp"
+        super().__init__(self.root / "files")
+    
+    def open(self, arcname: str, mode: str = 'w'):
+        os.utime(self.root)  # 刷新时间，避免长任务的临时目录被当作残留清理
+        return super().open(arcname, mode)
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()  # 处理中断（出错或取消），结果不会再被发布
+    
+    def discard(self):
+        """删除未发布的结果"""
+        shutil.rmtree(self.root, ignore_errors=True)
+    
+    def close(self):
+        """写出文件清单（名称和大小）"""
+        files = [{'name': name, 'size': (self.directory / name).stat().st_size} for name in self.names]
+        (self.root / "manifest.json").write_text(json.dumps(files, ensure_ascii=False), encoding='utf-8')
+
+
+def save_result(writer: ResultWriter) -> str:
+    """发布写入完成的结果，返回结果句柄（session中只保存句柄）"""
+    writer.close()
+    writer.root.replace(RESULT_DIR / writer.handle)
+    _enforce_limits(keep=writer.handle)
+    return writer.handle
+
+
+def result_exists(handle: str) -> bool:
+    root = _result_root(handle)
+    return root is not None and (root / "manifest.json").exists()
+
+
+def list_result_files(handle: str) -> List[str]:
+    """结果中的文件名列表（按写入顺序）"""
+    if not result_exists(handle):
+        return []
+    return [item['name'] for item in _read_manifest(_result_root(handle))]
+
+
+def read_result_file(handle: str, name: str) -> bytes:
+    """读取单个结果文件（单文件下载时调用）"""
+    path = result_file_path(handle, name)
+    return path.read_bytes() if path else b""
+
+
+def result_file_path(handle: str, name: str) -> Optional[Path]:
+    """单个结果文件的路径，不存在时返回None"""
+    root = _result_root(handle)
+    if root is None or name not in list_result_files(handle):
+        return None
+    os.utime(root)
+    cleanup_results(keep=handle)
+    return root / "files" / name
+
+
+def read_result(handle: str) -> bytes:
+    """读取全部结果的zip（页面下载按钮使用，Streamlit会把下载内容整体放入内存；其他调用方用copy_result流式复制）"""
+    archive_path = result_archive_path(handle)
+    return archive_path.read_bytes() if archive_path else b""
+
+
+def copy_result(handle: str, dest) -> bool:
+    """把全部结果的zip分块复制到文件对象，不整体读入内存；结果不存在时返回False"""
+    archive_path = result_archive_path(handle)
+    if archive_path is None:
+        return False
+    with open(archive_path, 'rb') as src:
+        shutil.copyfileobj(src, dest, COPY_CHUNK_SIZE)
+    return True
+
+
+def result_archive_path(handle: str) -> Optional[Path]:
+    """组装全部结果的zip并返回路径（已组装时直接返回缓存），结果不存在时返回None"""
+    from common.packaging import ResultArchive, is_stored
+    
+    root = _result_root(handle)
+    if not result_exists(handle):
+        return None
+    os.utime(root)
+    cleanup_results(keep=handle)
+    archive_path = root / "archive.zip"
+    if not archive_path.exists():
+        # 直接写入唯一的临时文件再改名（不经过内存缓冲），并发请求同一结果时互不干扰
+        temp_path = root / f"archive.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'wb') as dest, ResultArchive(dest) as archive:
+                for item in _read_manifest(root):
+                    path = root / "files" / item['name']
+                    if is_stored(item['name']) or item['size'] > ARCHIVE_PARALLEL_MAX_BYTES:
+                        with open(path, 'rb') as src, archive.open(item['name']) as entry:
+                            shutil.copyfileobj(src, entry, COPY_CHUNK_SIZE)
+                    else:
+                        archive.writestr(item['name'], path.read_bytes())
+            temp_path.replace(archive_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+    return archive_path
+
+
+def cleanup_results(keep: str = None):
+    """删除过期结果，距上次清理不足CLEANUP_INTERVAL秒时跳过"""
+    global _last_cleanup
+    if time.time() - _last_cleanup < CLEANUP_INTERVAL or not RESULT_DIR.exists():
+        return
+    _last_cleanup = time.time()
+    _enforce_limits(keep=keep)
+
+
+def delete_result(handle: str):
+    root = _result_root(handle)
+    if root is not None:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _safe_name(arcname: str) -> str:
+    """去掉绝对路径和..，保证输出文件落在结果目录内"""
+    parts = [part for part in PurePosixPath(arcname.replace('\\', '/')).parts if part not in ('/', '.', '..')]
+    if not parts:
+        raise ValueError(f"无效的文件名: {arcname}")
+    return '/'.join(parts)
+
+
+def _result_root(handle: str) -> Optional[Path]:
+    """句柄只允许uuid十六进制，避免拼出目录外的路径"""
+    if not handle or not re.fullmatch(r'[0-9a-f]{32}', handle):
+        return None
+    return RESULT_DIR / handle
+
+
+def _read_manifest(root: Path) -> list:
+    return json.loads((root / "manifest.json").read_text(encoding='utf-8'))
+
+
+def _result_size(root: Path) -> int:
+    size = sum(item['size'] for item in _read_manifest(root))
+    archive_path = root / "archive.zip"
+    return size + (archive_path.stat().st_size if archive_path.exists() else 0)
+
+
+def _enforce_limits(keep: str = None):
+    """删除过期结果和残留的临时目录；总大小超过上限时从最久未访问的开始删除"""
+    now = time.time()
+    with _lock:
+        entries = []
+        for root in RESULT_DIR.iterdir():
+            try:
+                mtime = root.stat().st_mtime
+                expired = now - mtime > RESULT_TTL
+                if root.name.endswith('.tmp'):
+                    if expired:
+                        shutil.rmtree(root, ignore_errors=True)
+                elif expired and root.name != keep:
+                    shutil.rmtree(root, ignore_errors=True)
+                else:
+                    entries.append((mtime, _result_size(root), root))
+            except (FileNotFoundError, ValueError, NotADirectoryError):
+                continue
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, root in sorted(entries):
+            if total <= RESULT_MAX_BYTES:
+                break
+            if root.name != keep:
+                shutil.rmtree(root, ignore_errors=True)
+                total -= size
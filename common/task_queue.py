@@ -0,0 +1,229 @@
+import os
+import time
+import socket
+import threading
+import traceback
+import multiprocessing
+from typing import Any, Optional, Tuple
+from .task_store import TASK_STORE, get_task_store, payload_bytes
+from .result_store import cleanup_results
+
+
+# 是否在当前进程（页面服务）中启动工作线程；使用独立处理进程（worker.py）时设为0，页面进程只提交任务
+EMBEDDED_WORKERS = os.environ.get("CDL_EMBEDDED_WORKERS", "1") != "0"
+# 同一通道内预计耗时短的任务优先（短作业优先），等待时间按该系数抵扣预计耗时，长任务不会一直被插队
+SJF_AGING = float(os.environ.get("CDL_SJF_AGING", 1.0))
+# 过期任务的清理间隔（秒）：在单独的线程中定期清理，队列持续繁忙时也不会堆积
+REAP_INTERVAL = int(os.environ.get("CDL_REAP_INTERVAL", 30))
+
+
+class TaskCancelled(BaseException):
+    """任务已取消；继承BaseException，处理函数中捕获Exception的容错代码不会拦截"""
+
+
+class TaskQueue:
+    """任务队列基类，单例模式：任务保存在任务存储（内存或SQLite）中，工作线程按提交顺序领取执行
+    
+    子类设置queue_name并实现_execute(payload)；需要分通道时重写_lanes和_store_queue
+    """
+    queue_name = None
+    _instances = {}
+    _lock = threading.RLock()
+    
+    def __new__(cls):
+        if cls not in cls._instances:
+            with cls._lock:
+                if cls not in cls._instances:
+                    instance = super().__new__(cls)
+                    instance.store = get_task_store()
+                    instance.worker_id = f"{socket.gethostname()}:{os.getpid()}:{cls.queue_name}"
+                    instance._local = threading.local()  # 记录当前线程正在处理的任务
+                    instance._worker_threads = []
+                    cls._instances[cls] = instance
+                    # 进程池的子进程也会导入队列模块（spawn导入主模块时parent_process()尚未设置），不能在子进程中领取任务；
+                    # 内存任务存储只在当前进程可见，始终在当前进程中处理
+                    embedded = EMBEDDED_WORKERS or TASK_STORE != "sqlite"
+                    if embedded and multiprocessing.current_process().name == 'MainProcess':
+                        instance.start_worker()
+        return cls._instances[cls]
+    
+    def start_worker(self):
+        """启动工作线程和过期任务清理线程（重复调用只启动一次）"""
+        with self._lock:
+            if not self._worker_threads:
+                for name, queues in self._lanes():
+                    thread = threading.Thread(target=self._worker_loop, args=(queues, f"{self.worker_id}:{name}"),
+                                              name=f"cdl-{self.queue_name}-{name}", daemon=True)
+                    thread.start()
+                    self._worker_threads.append(thread)
+                thread = threading.Thread(target=self._reaper_loop, name=f"cdl-{self.queue_name}-reaper", daemon=True)
+                thread.start()
+                self._worker_threads.append(thread)
+    
+    def _lanes(self) -> list:
+        """工作线程及其领取的存储队列 [(线程名, [队列名, ...])]，按列出的顺序优先领取"""
+        return [("worker", [self.queue_name])]
+    
+    def _store_queue(self, payload: dict, meta: dict) -> str:
+        """任务进入的存储队列"""
+        return self.queue_name
+    
+    def _store_queues(self) -> list:
+        return list(dict.fromkeys(queue for _, queues in self._lanes() for queue in queues))
+    
+    def _worker_loop(self, queues: list, worker_id: str):
+        """工作线程：领取并处理队列中的任务，出错时不退出"""
+        while True:
+            try:
+                self._process_next(queues, worker_id)
+            except Exception:
+                traceback.print_exc()
+                time.sleep(1)
+    
+    def _process_next(self, queues: list, worker_id: str):
+        task = self.store.claim(queues, worker_id, timeout=1)
+        if task is None:
+            return
+        
+        self._local.task_id = task['id']
+        started = time.time()
+        try:
+            with self.store.lease(task['id'], worker_id):
+                result = self._execute(task['payload'])
+            if self.store.is_cancelled(task['id']):
+                # 处理完成前已取消（处理函数未检查取消），丢弃结果
+                self._discard_result(result)
+                self.store.remove(task['id'])
+                return
+            self.store.complete(task['id'], result)
+        except TaskCancelled:
+            self.store.remove(task['id'])
+            return
+        except Exception as e:
+            # 处理函数抛出异常：任务标记为失败，工作线程继续处理后续任务
+            traceback.print_exc()
+            self.store.fail(task['id'], f"处理出错：{e}")
+            return
+        finally:
+            self._local.task_id = None
+        meta = task['meta']
+        self.store.record_run(meta.get('tool') or self.queue_name, task['bytes'], meta.get('estimated_seconds'), time.time() - started)
+    
+    def _reaper_loop(self):
+        """清理线程：定期删除过期任务（无人等待、结果长时间未取走、已取消但处理进程已退出）和过期的结果文件"""
+        while True:
+            time.sleep(REAP_INTERVAL)
+            try:
+                for queue in self._store_queues():
+                    self.store.cleanup(queue)
+                cleanup_results()
+            except Exception:
+                traceback.print_exc()
+    
+    def _execute(self, payload: dict) -> Any:
+        raise NotImplementedError
+    
+    def _discard_result(self, result: Any):
+        """丢弃已取消任务的结果（如删除已写入的结果文件）"""
+    
+    def submit(self, payload: dict, meta: Optional[dict] = None) -> str:
+        """提交任务，返回任务ID；超过排队限制时抛出QueueFullError（meta中的owner为提交者，页面中默认为当前会话）"""
+        meta = dict(meta or {})
+        if 'owner' not in meta:
+            meta['owner'] = _session_owner()
+        meta['expected_seconds'] = self._expected_seconds(payload, meta)
+        # 优先级 = 预计耗时 - 等待时间×系数，按提交时间换算为固定值，排序不随时间变化
+        priority = meta['expected_seconds'] + time.time() * SJF_AGING
+        return self.store.add(self._store_queue(payload, meta), payload, meta, priority)
+    
+    def _expected_seconds(self, payload: dict, meta: dict) -> float:
+        """预计耗时：有提交时的预估（如PDF页数）时按该工具的历史偏差校正，否则按输入大小和历史吞吐估算"""
+        bytes_per_second, estimate_ratio = self.store.tool_stats(meta.get('tool') or self.queue_name)
+        if meta.get('estimated_seconds'):
+            return meta['estimated_seconds'] * estimate_ratio
+        return payload_bytes(payload) / bytes_per_second
+    
+    def get_task_position(self, task_id: str) -> int:
+        """获取任务在队列中的位置（1-based），0表示正在处理或已完成"""
+        self.store.touch(task_id)
+        return self.store.position(task_id)
+    
+    def get_task_status(self, task_id: str) -> Optional[str]:
+        """获取任务状态（同时记录有人在等待该任务，长时间无人查询的等待任务会被清理）"""
+        self.store.touch(task_id)
+        task = self.store.get(task_id)
+        return task['status'] if task else None
+    
+    def cancel_task(self, task_id: str):
+        """取消任务：排队中的移出队列，处理中的在处理函数下次检查时停止（LibreOffice进程直接结束）"""
+        self.store.cancel(task_id)
+    
+    def cancel_requested(self) -> bool:
+        """由处理函数调用：当前任务是否已取消"""
+        task_id = getattr(self._local, 'task_id', None)
+        return bool(task_id) and self.store.is_cancelled(task_id)
+    
+    def check_cancelled(self):
+        """由处理函数在文件或页之间调用，当前任务已取消时抛出TaskCancelled停止处理"""
+        if self.cancel_requested():
+            raise TaskCancelled()
+    
+    def report_progress(self, done: int, total: int):
+        """由处理函数调用，上报当前任务进度"""
+        task_id = getattr(self._local, 'task_id', None)
+        if task_id:
+            self.store.update(task_id, progress=(done, total))
+    
+    def get_task_error(self, task_id: str) -> Optional[str]:
+        """获取失败任务的错误信息"""
+        task = self.store.get(task_id)
+        return task.get('error') if task else None
+    
+    def get_task_bytes(self, task_id: str) -> int:
+        """任务当前占用的字节数（内存任务存储为内存中的输入和结果，SQLite任务存储为磁盘上的输入和结果）"""
+        return self.store.retained_bytes(task_id)
+    
+    def get_task_progress(self, task_id: str) -> Optional[Tuple[int, int]]:
+        """获取任务进度 (已完成数, 总数)，未上报时返回None"""
+        task = self.store.get(task_id)
+        return task['progress'] if task else None
+    
+    def report_partial(self, partial: Any):
+        """由处理函数调用，上报当前任务的阶段性结果（已完成的文件、预览等）"""
+        task_id = getattr(self._local, 'task_id', None)
+        if task_id:
+            self.store.update(task_id, partial=partial)
+    
+    def get_task_partial(self, task_id: str) -> Any:
+        """获取任务的阶段性结果，未上报时返回None"""
+        task = self.store.get(task_id)
+        return task['partial'] if task else None
+    
+    def wait_for_task(self, task_id: str, timeout: int = 300):
+        """等待任务完成并返回结果"""
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            status = self.get_task_status(task_id)
+            if status == "completed":
+                return self.store.take_result(task_id)
+            if status is None or status == "failed":
+                break
+            time.sleep(0.2)
+        
+        # 超时或失败：取消任务，正在处理的也会停止
+        self.cancel_task(task_id)
+        return None
+    
+    def get_queue_size(self):
+        """获取当前队列大小（各通道合计）"""
+        return sum(self.store.count(queue, 'waiting') for queue in self._store_queues())
+
+
+def _session_owner() -> str:
+    """页面中提交时为Streamlit会话ID，其他调用方为空（只受全局限制）"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return ''
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else ''
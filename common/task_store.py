@@ -0,0 +1,601 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager, nullcontext
+from typing import Any, Optional
+from common.archive_input import ArchiveEntry, LocalFile
+
+
+# 任务存储：memory（默认，仅当前进程）或 sqlite（任务和输入落盘，重启后继续处理，多个进程可共享）
+TASK_STORE = os.environ.get("CDL_TASK_STORE", "memory")
+TASK_DIR = Path(os.environ.get("CDL_TASK_DIR") or Path(tempfile.gettempdir()) / "cdl_tasks")
+# 领取任务后的租约（秒），处理期间自动续约；进程退出后租约过期，任务可被重新领取
+TASK_LEASE = int(os.environ.get("CDL_TASK_LEASE", 60))
+# 同一任务最多领取次数，超过后标记为失败，避免反复导致进程崩溃的任务无限重试
+MAX_ATTEMPTS = 3
+# 过期清理：超过10分钟无人查询状态的等待任务（页面或接口客户端已不再等待）、完成超过1小时的任务；
+# 排队时间本身不限，长任务排在后面等待超过10分钟是正常的
+WAITING_TTL = 600
+COMPLETED_TTL = 3600
+# 查询状态时记录最近查询时间的最小间隔（秒），避免每次轮询都写数据库
+TOUCH_INTERVAL = 10
+POLL_INTERVAL = 0.2
+# 准入限制：排队和处理中的任务数、输入文件总大小，全局和单个会话（页面会话或HTTP客户端）分别限制
+QUEUE_MAX_TASKS = int(os.environ.get("CDL_QUEUE_MAX_TASKS", 100))
+QUEUE_MAX_BYTES = int(os.environ.get("CDL_QUEUE_MAX_MB", 4096)) * 1024 * 1024
+SESSION_MAX_TASKS = int(os.environ.get("CDL_SESSION_MAX_TASKS", 5))
+SESSION_MAX_BYTES = int(os.environ.get("CDL_SESSION_MAX_MB", 1024)) * 1024 * 1024
+# 内存任务存储中排队的输入超过该大小后，新任务的输入先写入磁盘，不再占用内存
+SPILL_BYTES = int(os.environ.get("CDL_SPILL_MB", 256)) * 1024 * 1024
+ACTIVE = ('waiting', 'processing')
+# 各工具历史吞吐的指数移动平均：新样本权重，以及没有历史时的默认吞吐（字节/秒）
+EWMA_ALPHA = 0.2
+DEFAULT_BYTES_PER_SECOND = 1024 * 1024
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_task_store():
+    """全局任务存储（两个队列共用）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if TASK_STORE == "sqlite":
+                _store = SQLiteTaskStore(TASK_DIR / "tasks.db", TASK_DIR / "blobs")
+            else:
+                _store = MemoryTaskStore()
+        return _store
+
+
+class QueueFullError(Exception):
+    """超过准入限制，任务未提交；消息可直接展示给用户"""
+
+
+class MemoryTaskStore:
+    """内存任务存储：任务内容直接保存对象，进程重启后丢失；排队输入过多时写入磁盘"""
+    
+    def __init__(self):
+        self.tasks = {}   # task_id -> task_dict
+        self.order = {}   # 队列名 -> 等待中的 (优先级, 任务ID)，按优先级排序
+        self.stats = {}   # 工具 -> (吞吐 字节/秒, 实际/预估耗时比)
+        self._cond = threading.Condition()
+    
+    def add(self, queue: str, payload: dict, meta: dict, priority: Optional[float] = None) -> str:
+        """priority越小越先处理（默认按提交时间）；超过准入限制时抛出QueueFullError"""
+        task_id = str(uuid.uuid4())
+        owner, size = meta.get('owner', ''), payload_bytes(payload)
+        with self._cond:
+            _check_admission(size, *self._usage(owner))
+            memory_bytes = sum(task['memory_bytes'] for task in self.tasks.values() if task['payload'] is not None)
+        
+        spill_dir, resident = TASK_DIR / "spill" / task_id, payload_bytes(payload, resident=True)
+        spill = bool(resident) and memory_bytes + resident > SPILL_BYTES
+        # 压缩包始终链接到任务目录（上传目录中的zip过期清理后任务仍可读取），上传内容只在超过限制时写入磁盘
+        payload = _spool(payload, spill_dir / "inputs", {}, uploads=spill)
+        if spill:
+            resident = 0
+        if not spill_dir.exists():
+            spill_dir = None
+        task = {
+            'id': task_id,
+            'queue': queue,
+            'payload': payload,
+            'meta': meta,
+            'owner': owner,
+            'bytes': size,
+            'memory_bytes': resident,
+            'spill_dir': spill_dir,
+            'priority': time.time() if priority is None else priority,
+            'status': 'waiting',
+            'result': None,
+            'progress': None,
+            'partial': None,
+            'created_time': time.time(),
+            'last_seen': time.time()
+        }
+        with self._cond:
+            try:
+                _check_admission(size, *self._usage(owner))
+            except QueueFullError:
+                if spill_dir:
+                    shutil.rmtree(spill_dir, ignore_errors=True)
+                raise
+            self.tasks[task_id] = task
+            bisect.insort(self.order.setdefault(queue, []), (task['priority'], task_id))
+            self._cond.notify_all()
+        return task_id
+    
+    def claim(self, queues: list, worker_id: str, timeout: float = 1) -> Optional[dict]:
+        """按顺序在所列队列中领取最早提交的等待任务，没有任务时最多等待timeout秒"""
+        with self._cond:
+            if not any(self.order.get(queue) for queue in queues):
+                self._cond.wait(timeout)
+            for queue in queues:
+                waiting = self.order.get(queue)
+                if waiting:
+                    task = self.tasks[waiting.pop(0)[1]]
+                    task['status'] = 'processing'
+                    return task
+            return None
+    
+    def lease(self, task_id: str, worker_id: str):
+        return nullcontext()
+    
+    def cancel(self, task_id: str):
+        """取消任务：等待中的直接删除，处理中的标记取消，由处理线程停止后删除"""
+        with self._cond:
+            task = self.tasks.get(task_id)
+            if task and task['status'] == 'processing':
+                task['cancelled'] = True
+                return
+        self.remove(task_id)
+    
+    def is_cancelled(self, task_id: str) -> bool:
+        """任务已取消或已被删除"""
+        task = self.tasks.get(task_id)
+        return task is None or task.get('cancelled', False)
+    
+    def complete(self, task_id: str, result: Any):
+        task = self.tasks.get(task_id)
+        if task:
+            task['payload'] = None  # 释放输入
+            task['result'] = result
+            task['memory_bytes'] = payload_bytes(result, resident=True)
+            task['status'] = 'completed'
+            task['completed_time'] = time.time()
+    
+    def fail(self, task_id: str, error: str):
+        """处理出错，标记为失败并释放输入"""
+        task = self.tasks.get(task_id)
+        if task:
+            task.update(payload=None, memory_bytes=0, status='failed', error=error, completed_time=time.time())
+    
+    def get(self, task_id: str) -> Optional[dict]:
+        return self.tasks.get(task_id)
+    
+    def touch(self, task_id: str):
+        """记录最近查询时间，有人等待的任务不会被当作无人等待清理"""
+        task = self.tasks.get(task_id)
+        if task:
+            task['last_seen'] = time.time()
+    
+    def update(self, task_id: str, **fields):
+        task = self.tasks.get(task_id)
+        if task:
+            task.update(fields)
+    
+    def position(self, task_id: str) -> int:
+        task = self.tasks.get(task_id)
+        if not task or task['status'] != 'waiting':
+            return 0
+        with self._cond:
+            index = self._order_index(task)
+            return 0 if index is None else index + 1
+    
+    def count(self, queue: str, status: str = 'waiting') -> int:
+        if status == 'waiting':
+            return len(self.order.get(queue, ()))
+        return sum(1 for task in list(self.tasks.values()) if task['queue'] == queue and task['status'] == status)
+    
+    def retained_bytes(self, task_id: str) -> int:
+        """任务在内存中占用的字节数（未写入磁盘的输入，或完成后的结果）"""
+        task = self.tasks.get(task_id)
+        return task['memory_bytes'] if task else 0
+    
+    def take_result(self, task_id: str) -> Any:
+        """取出已完成任务的结果并删除任务"""
+        task = self.tasks.get(task_id)
+        self.remove(task_id)
+        return task['result'] if task else None
+    
+    def remove(self, task_id: str):
+        with self._cond:
+            task = self.tasks.pop(task_id, None)
+            index = self._order_index(task) if task else None
+            if index is not None:
+                del self.order[task['queue']][index]
+        if task and task['spill_dir']:
+            shutil.rmtree(task['spill_dir'], ignore_errors=True)
+    
+    def cleanup(self, queue: str):
+        """清理过期任务"""
+        current_time = time.time()
+        with self._cond:
+            stale_tasks = [task_id for task_id, task in self.tasks.items() if task['queue'] == queue and _is_stale(task, current_time)]
+        for task_id in stale_tasks:
+            self.remove(task_id)
+    
+    def record_run(self, tool: str, size: int, estimated_seconds: Optional[float], seconds: float):
+        """记录一次处理的耗时，更新该工具的吞吐和预估偏差"""
+        with self._cond:
+            self.stats[tool] = _update_stats(self.stats.get(tool), size, estimated_seconds, seconds)
+    
+    def tool_stats(self, tool: str):
+        """(吞吐 字节/秒, 实际/预估耗时比)"""
+        return self.stats.get(tool) or (DEFAULT_BYTES_PER_SECOND, 1.0)
+    
+    def _order_index(self, task: dict) -> Optional[int]:
+        """等待任务在所在队列中的下标（二分查找），不在等待队列中时返回None"""
+        waiting = self.order.get(task['queue'], [])
+        key = (task['priority'], task['id'])
+        index = bisect.bisect_left(waiting, key)
+        return index if index < len(waiting) and waiting[index] == key else None
+    
+    def _usage(self, owner: str):
+        """(全局任务数, 全局字节数, 会话任务数, 会话字节数)，只统计排队和处理中的任务"""
+        active = [task for task in self.tasks.values() if task['status'] in ACTIVE]
+        mine = [task for task in active if owner and task['owner'] == owner]
+        return len(active), sum(task['bytes'] for task in active), len(mine), sum(task['bytes'] for task in mine)
+
+
+class SQLiteTaskStore:
+    """SQLite任务存储：任务状态保存在数据库中，输入文件和结果落盘到blob目录
+    
+    领取任务时加租约，处理期间定期续约；进程退出后租约过期，任务会被重新领取（至少执行一次）
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT UNIQUE NOT NULL,
+            queue TEXT NOT NULL,
+            status TEXT NOT NULL,
+            meta TEXT,
+            progress TEXT,
+            partial TEXT,
+            worker TEXT,
+            lease_until REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_time REAL NOT NULL,
+            completed_time REAL,
+            owner TEXT NOT NULL DEFAULT '',
+            bytes INTEGER NOT NULL DEFAULT 0,
+            priority REAL NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            last_seen REAL,
+            retained_bytes INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_queue_status ON tasks (queue, status, seq);
+        CREATE TABLE IF NOT EXISTS tool_stats (
+            tool TEXT PRIMARY KEY,
+            bytes_per_second REAL NOT NULL,
+            estimate_ratio REAL NOT NULL
+        );
+    """
+    # 旧版本数据库缺少的列
+    COLUMNS = {'owner': "TEXT NOT NULL DEFAULT ''", 'bytes': "INTEGER NOT NULL DEFAULT 0", 'priority': "REAL NOT NULL DEFAULT 0",
+               'cancelled': "INTEGER NOT NULL DEFAULT 0", 'error': "TEXT",
+               'last_seen': "REAL", 'retained_bytes': "INTEGER NOT NULL DEFAULT 0"}
+    
+    def __init__(self, path, blob_dir):
+        self.path = str(path)
+        self.blob_dir = Path(blob_dir)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()  # 每个线程使用独立连接
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        existing = {row['name'] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for name, definition in self.COLUMNS.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {name} {definition}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (queue, status, priority, seq)")
+    
+    def add(self, queue: str, payload: dict, meta: dict, priority: Optional[float] = None) -> str:
+        """输入文件复制到blob目录后写入任务，提交后不再依赖上传对象所在的内存
+        
+        priority越小越先处理（默认按提交时间）；超过准入限制时抛出QueueFullError
+        """
+        task_id = str(uuid.uuid4())
+        owner, size = meta.get('owner', ''), payload_bytes(payload)
+        with self._transaction() as conn:
+            _check_admission(size, *self._usage(conn, owner))  # 先检查，避免为会被拒绝的任务复制文件
+        
+        task_dir = self.blob_dir / task_id
+        (task_dir / "inputs").mkdir(parents=True)
+        try:
+            payload = _spool(payload, task_dir / "inputs", {})
+            _write_pickle(task_dir / "payload.pkl", payload)
+            retained = _dir_size(task_dir)
+            with self._transaction() as conn:
+                _check_admission(size, *self._usage(conn, owner))
+                now = time.time()
+                conn.execute("""INSERT INTO tasks (id, queue, status, meta, owner, bytes, priority, created_time, last_seen, retained_bytes)
+                                VALUES (?, ?, 'waiting', ?, ?, ?, ?, ?, ?, ?)""",
+                             (task_id, queue, json.dumps(meta or {}), owner, size, now if priority is None else priority, now, now, retained))
+        except BaseException:
+            shutil.rmtree(task_dir, ignore_errors=True)
+            raise
+        return task_id
+    
+    def claim(self, queues: list, worker_id: str, timeout: float = 1) -> Optional[dict]:
+        """按顺序在所列队列中领取最早提交的等待任务或租约已过期的任务，没有任务时最多等待timeout秒"""
+        deadline = time.time() + timeout
+        while True:
+            for queue in queues:
+                task = self._claim_once(queue, worker_id)
+                if task is not None:
+                    return task
+            if time.time() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+    
+    @contextmanager
+    def lease(self, task_id: str, worker_id: str):
+        """处理期间在后台线程中定期续约"""
+        stopped = threading.Event()
+        
+        def renew():
+            while not stopped.wait(TASK_LEASE / 3):
+                self._conn().execute("UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ?",
+                                     (time.time() + TASK_LEASE, task_id, worker_id))
+        
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+    
+    def cancel(self, task_id: str):
+        """取消任务：等待中的直接删除，处理中的标记取消，由处理进程停止后删除；已结束的删除记录和结果"""
+        with self._transaction() as conn:
+            # 判断状态和删除在同一事务中，处理进程不会在两者之间领取任务
+            row = conn.execute("SELECT status FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                return
+            if row['status'] == 'processing':
+                conn.execute("UPDATE tasks SET cancelled = 1 WHERE id = ?", (task_id,))
+                return
+            deleted = conn.execute("DELETE FROM tasks WHERE id = ? AND status != 'processing'", (task_id,)).rowcount
+        if deleted:
+            shutil.rmtree(self.blob_dir / task_id, ignore_errors=True)
+    
+    def is_cancelled(self, task_id: str) -> bool:
+        """任务已取消或已被删除"""
+        row = self._conn().execute("SELECT cancelled FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return row is None or bool(row['cancelled'])
+    
+    def complete(self, task_id: str, result: Any):
+        task_dir = self.blob_dir / task_id
+        if not task_dir.exists():
+            return
+        _write_pickle(task_dir / "result.pkl", result)
+        self._conn().execute("""UPDATE tasks SET status = 'completed', completed_time = ?, lease_until = NULL, retained_bytes = retained_bytes + ?
+                                WHERE id = ?""", (time.time(), (task_dir / "result.pkl").stat().st_size, task_id))
+    
+    def fail(self, task_id: str, error: str):
+        """处理出错，标记为失败（不再重新领取）"""
+        self._conn().execute("UPDATE tasks SET status = 'failed', error = ?, completed_time = ?, lease_until = NULL WHERE id = ?",
+                             (error, time.time(), task_id))
+    
+    def get(self, task_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = dict(row)
+        task['meta'] = json.loads(task['meta'] or '{}')
+        task['progress'] = tuple(json.loads(task['progress'])) if task['progress'] else None
+        task['partial'] = json.loads(task['partial']) if task['partial'] else None
+        return task
+    
+    def touch(self, task_id: str):
+        """记录最近查询时间（每TOUCH_INTERVAL秒最多写一次），有人等待的任务不会被当作无人等待清理"""
+        now = time.time()
+        self._conn().execute("UPDATE tasks SET last_seen = ? WHERE id = ? AND status = 'waiting' AND COALESCE(last_seen, 0) < ?",
+                             (now, task_id, now - TOUCH_INTERVAL))
+    
+    def update(self, task_id: str, **fields):
+        """更新进度或阶段性结果（JSON保存）"""
+        for name, value in fields.items():
+            if name in ('progress', 'partial'):
+                self._conn().execute(f"UPDATE tasks SET {name} = ? WHERE id = ?",
+                                     (json.dumps(value, ensure_ascii=False), task_id))
+    
+    def position(self, task_id: str) -> int:
+        # 按 (队列, 状态, 优先级, 序号) 索引只扫描排在前面的任务
+        row = self._conn().execute("""
+            SELECT COUNT(*) FROM tasks s JOIN tasks t ON t.queue = s.queue AND t.status = 'waiting'
+                AND (t.priority, t.seq) <= (s.priority, s.seq)
+            WHERE s.id = ? AND s.status = 'waiting'
+        """, (task_id,)).fetchone()
+        return row[0]
+    
+    def count(self, queue: str, status: str = 'waiting') -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM tasks WHERE queue = ? AND status = ?", (queue, status)).fetchone()[0]
+    
+    def retained_bytes(self, task_id: str) -> int:
+        """任务在磁盘上占用的字节数（输入文件和结果，写入时记录）"""
+        row = self._conn().execute("SELECT retained_bytes FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return row[0] if row else 0
+    
+    def take_result(self, task_id: str) -> Any:
+        """取出已完成任务的结果并删除任务"""
+        path = self.blob_dir / task_id / "result.pkl"
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            result = None
+        self.remove(task_id)
+        return result
+    
+    def remove(self, task_id: str):
+        self._conn().execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        shutil.rmtree(self.blob_dir / task_id, ignore_errors=True)
+    
+    def cleanup(self, queue: str):
+        """清理过期任务（与内存存储的规则一致）"""
+        current_time = time.time()
+        rows = self._conn().execute("""
+            SELECT id FROM tasks WHERE queue = ? AND (
+                (status = 'waiting' AND COALESCE(last_seen, created_time) < ?) OR (status IN ('completed', 'failed') AND completed_time < ?)
+                OR (status = 'processing' AND cancelled = 1 AND lease_until < ?))
+        """, (queue, current_time - WAITING_TTL, current_time - COMPLETED_TTL, current_time)).fetchall()
+        for row in rows:
+            self.remove(row[0])
+    
+    def record_run(self, tool: str, size: int, estimated_seconds: Optional[float], seconds: float):
+        """记录一次处理的耗时，更新该工具的吞吐和预估偏差（多个处理进程共享）"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT bytes_per_second, estimate_ratio FROM tool_stats WHERE tool = ?", (tool,)).fetchone()
+            stats = _update_stats(tuple(row) if row else None, size, estimated_seconds, seconds)
+            conn.execute("INSERT OR REPLACE INTO tool_stats (tool, bytes_per_second, estimate_ratio) VALUES (?, ?, ?)", (tool, *stats))
+    
+    def tool_stats(self, tool: str):
+        """(吞吐 字节/秒, 实际/预估耗时比)"""
+        row = self._conn().execute("SELECT bytes_per_second, estimate_ratio FROM tool_stats WHERE tool = ?", (tool,)).fetchone()
+        return tuple(row) if row else (DEFAULT_BYTES_PER_SECOND, 1.0)
+    
+    def _usage(self, conn, owner: str):
+        """(全局任务数, 全局字节数, 会话任务数, 会话字节数)，只统计排队和处理中的任务"""
+        row = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(SUM(owner = ?), 0), COALESCE(SUM(CASE WHEN owner = ? THEN bytes END), 0)
+            FROM tasks WHERE status IN ('waiting', 'processing')
+        """, (owner, owner)).fetchone()
+        if not owner:
+            return row[0], row[1], 0, 0
+        return tuple(row)
+    
+    def _claim_once(self, queue: str, worker_id: str) -> Optional[dict]:
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                # 租约过期的任务（处理进程已退出）优先重新领取，其余按优先级
+                row = conn.execute("""
+                    SELECT id, attempts, meta, bytes FROM tasks WHERE queue = ? AND cancelled = 0 AND
+                        (status = 'waiting' OR (status = 'processing' AND lease_until < ?))
+                    ORDER BY status = 'waiting', priority, seq LIMIT 1
+                """, (queue, now)).fetchone()
+                if row is None:
+                    return None
+                if row['attempts'] < MAX_ATTEMPTS:
+                    break
+                conn.execute("UPDATE tasks SET status = 'failed', error = ?, completed_time = ? WHERE id = ?",
+                             (f"任务已领取{MAX_ATTEMPTS}次仍未完成（处理进程反复中断），已放弃", now, row['id']))
+            conn.execute("UPDATE tasks SET status = 'processing', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                         (worker_id, now + TASK_LEASE, row['id']))
+        
+        with open(self.blob_dir / row['id'] / "payload.pkl", 'rb') as f:
+            payload = pickle.load(f)
+        return {'id': row['id'], 'queue': queue, 'payload': payload, 'meta': json.loads(row['meta'] or '{}'), 'bytes': row['bytes']}
+    
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    @contextmanager
+    def _transaction(self):
+        """立即获取写锁的事务，多个进程同时领取任务时不会领到同一个"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _is_stale(task: dict, current_time: float) -> bool:
+    return (task['status'] == 'waiting' and current_time - task.get('last_seen', current_time) > WAITING_TTL) or \
+           (task['status'] in ('completed', 'failed') and current_time - task.get('completed_time', current_time) > COMPLETED_TTL)
+
+
+def _update_stats(stats, size: int, estimated_seconds: Optional[float], seconds: float):
+    """按指数移动平均更新 (吞吐, 实际/预估耗时比)"""
+    bytes_per_second, estimate_ratio = stats or (DEFAULT_BYTES_PER_SECOND, 1.0)
+    seconds = max(seconds, 0.01)
+    if size:
+        bytes_per_second += EWMA_ALPHA * (size / seconds - bytes_per_second)
+    if estimated_seconds:
+        estimate_ratio += EWMA_ALPHA * (seconds / estimated_seconds - estimate_ratio)
+    return bytes_per_second, estimate_ratio
+
+
+def _check_admission(size: int, tasks: int, total_bytes: int, session_tasks: int, session_bytes: int):
+    """超过任一限制时抛出QueueFullError"""
+    mb = 1024 * 1024
+    if size > min(QUEUE_MAX_BYTES, SESSION_MAX_BYTES):
+        raise QueueFullError(f"本次提交的文件共 {size / mb:.0f} MB，超过单次上限 {min(QUEUE_MAX_BYTES, SESSION_MAX_BYTES) // mb} MB，请分批处理")
+    if session_tasks >= SESSION_MAX_TASKS:
+        raise QueueFullError(f"当前已有 {session_tasks} 个任务在排队或处理中，请等待完成后再提交")
+    if session_bytes + size > SESSION_MAX_BYTES:
+        raise QueueFullError(f"当前排队中的文件共 {session_bytes / mb:.0f} MB，加上本次提交超过上限 {SESSION_MAX_BYTES // mb} MB，请等待完成后再提交")
+    if tasks >= QUEUE_MAX_TASKS:
+        raise QueueFullError(f"处理队列已满（{tasks} 个任务在排队或处理中），请稍后再试")
+    if total_bytes + size > QUEUE_MAX_BYTES:
+        raise QueueFullError(f"处理队列中待处理的文件已达 {total_bytes / mb:.0f} MB，请稍后再试")
+
+
+def payload_bytes(value, resident: bool = False) -> int:
+    """任务内容中输入文件的总大小；resident为True时只统计在内存中的（不含本地文件和压缩包内的文件）"""
+    if isinstance(value, dict):
+        return sum(payload_bytes(item, resident) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_bytes(item, resident) for item in value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if resident and isinstance(value, (LocalFile, ArchiveEntry)):
+        return 0
+    if hasattr(value, 'getvalue'):
+        return getattr(value, 'size', 0)
+    return 0
+
+
+def _spool(value, input_dir: Path, linked: dict, uploads: bool = True):
+    """把任务内容中的上传文件写入磁盘，替换为本地文件引用；压缩包内的文件只链接（或复制）一次压缩包
+    
+    uploads为False时只处理压缩包，内存中的上传文件保持不变
+    """
+    if isinstance(value, dict):
+        return {key: _spool(item, input_dir, linked, uploads) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_spool(item, input_dir, linked, uploads) for item in value)
+    if isinstance(value, LocalFile):
+        return value
+    if isinstance(value, ArchiveEntry):
+        if value.zip_path not in linked:
+            input_dir.mkdir(parents=True, exist_ok=True)
+            linked[value.zip_path] = str(_link_or_copy(value.zip_path, input_dir / f"{uuid.uuid4().hex}.zip"))
+        return ArchiveEntry(linked[value.zip_path], value.member, value.name, value.file_id, value.size)
+    if uploads and hasattr(value, 'getvalue') and hasattr(value, 'name'):
+        input_dir.mkdir(parents=True, exist_ok=True)
+        path = input_dir / uuid.uuid4().hex
+        path.write_bytes(value.getvalue())
+        return LocalFile(path, value.name)
+    return value
+
+
+def _link_or_copy(src, dest: Path) -> Path:
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+    return dest
+
+
+def _dir_size(path: Path) -> int:
+    return sum(item.stat().st_size for item in path.rglob('*') if item.is_file())
+
+
+def _write_pickle(path: Path, value):
+    temp_path = path.with_suffix('.tmp')
+    with open(temp_path, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    temp_path.replace(path)
@@ -27,11 +27,15 @@ st.markdown("""
 **必须导入统一样式**：`from common.ui_style import apply_custom_style`
 
 ### 4. 添加队列和交互优化
-- **选择队列**：LibreOffice任务用 `lo_queue`，其他文件处理用 `fp_queue`
+- **选择队列**：LibreOffice任务用 `lo_queue`，其他文件处理用 `fp_queue`（`meta` 中传入 `tool` 工具名，用于选择轻量或重量通道）；提交给 `fp_queue` 的处理函数需为 `common/processors` 中的模块级函数（SQLite任务存储按引用序列化任务）；超过排队限制时 `submit_task` 抛出 `common.task_store.QueueFullError`，页面捕获后清除 `tool_prefix_task_running` 并显示其提示
 - **状态隔离**：每个工具使用独立前缀，如 `tool_prefix_key`、`tool_prefix_result`、`tool_prefix_task_running`
 - **按钮防误点击**：转换按钮加 `disabled="tool_prefix_task_running" in st.session_state`，点击时设置状态并刷新
 - **添加重置按钮**：下载区域添加重置按钮，清理 `tool_prefix_result` 和 `tool_prefix_task_running` 状态
+- **结果存储**：处理函数把输出文件写入 `common.result_store.ResultWriter`（接口同zipfile的writestr/open），页面用 `save_result` 发布后session中只保存返回的句柄；下载按钮传入 `partial(read_result, handle)`（点击时才打包zip），单文件下载用 `list_result_files`/`read_result_file`，重置时调用 `delete_result(handle)`
 - **文件上传器重置**：使用 `key=f"uploader_{st.session_state.tool_prefix_key}"` 实现重置
+- **支持zip上传**：上传器 `type` 中加入 `'zip'`，用 `common.archive_input.expand_uploads(uploaded_files, 扩展名)` 展开为文件列表；处理时才调用 `getvalue()` 读取内容，输出文件名用 `output_stem(文件名)` 以保留zip中的目录结构
+- **处理函数放在common/processors**：处理逻辑写成不依赖streamlit的 `process_files_batch(files_data, writer=None)`，页面只负责交互；在 `common/processors/__init__.py` 的 `TOOLS` 和 `run_tool` 中登记后，命令行 `cli.py` 和HTTP任务接口（`common/http_api.py`）即可调用
+- **支持取消**：处理函数在文件（或页）之间调用 `fp_queue.check_cancelled()`，任务被取消时停止处理；页面的轮询循环放在 `try ... finally: queue.cancel_task(task_id)` 中，重置页面、重新运行或会话关闭中断脚本时取消任务
             
 ### 5. 对新应用增加说明
 （1）**更新readme.md**：应用创建后，需要更新根目录下的`readme.md`文件，添加应用说明
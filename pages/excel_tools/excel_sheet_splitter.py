@@ -1,77 +1,18 @@
 import streamlit as st
 import pandas as pd
 from pathlib import Path
-from openpyxl import load_workbook
-import io
-import zipfile
-import shutil
-import tempfile
 import time
+from functools import partial
 from datetime import datetime
 from common.ui_style import apply_custom_style
 from common.file_processing_queue import fp_queue
+from common.task_store import QueueFullError
+from common.result_store import delete_result, list_result_files, read_result, read_result_file, result_exists, save_result
+from common.archive_input import expand_uploads
+from common.processors.excel_split import process_files_batch, split_excel_file
 
-
-def split_excel_file(file_data, file_name, zip_writer=None):
-    """核心拆分函数：使用文件复制方式完整保留所有样式"""
-    base_name = Path(file_name).stem
-    
-    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as temp_file:
-        temp_file.write(file_data.getvalue())
-        temp_path = temp_file.name
-    
-    try:
-        workbook = load_workbook(temp_path, data_only=True)
-        sheet_names = workbook.sheetnames
-        workbook.close()
-        
-        # 如果只是获取sheet信息，直接返回
-        if zip_writer is None:
-            return len(sheet_names)
-        
-        if len(sheet_names) == 1:
-            return 0  # 跳过单sheet文件
-        
-        # 为每个sheet创建独立文件
-        for sheet_name in sheet_names:
-            with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as target_temp:
-                shutil.copy2(temp_path, target_temp.name)
-                
-                wb = load_workbook(target_temp.name)
-                for remove_name in [n for n in wb.sheetnames if n != sheet_name]:
-                    wb.remove(wb[remove_name])
-                
-                excel_buffer = io.BytesIO()
-                wb.save(excel_buffer)
-                wb.close()
-                
-                zip_writer.writestr(f"{base_name}-{sheet_name}.xlsx", excel_buffer.getvalue())
-        
-        return len(sheet_names)  # 返回处理的sheet数量
-        
-    finally:
-        Path(temp_path).unlink(missing_ok=True)
-
-
-
-
-def process_files_batch(files_data):
-    """批处理文件并返回结果"""
-    zip_buffer = io.BytesIO()
-    results = []
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for file_data, file_name in files_data:
-            try:
-                sheet_count = split_excel_file(file_data, file_name, zipf)
-                if sheet_count == 0:
-                    results.append([file_name, 1, '⏩ 已跳过(单sheet)'])
-                else:
-                    results.append([file_name, sheet_count, f'✅ 已拆分({sheet_count}个sheet)'])
-            except Exception as e:
-                results.append([file_name, 0, f'❌ {str(e)[:15]}...'])
-    
-    return zip_buffer, results
+# 文件较多时只预览前几个，避免每次页面刷新都读取全部文件
+PREVIEW_MAX_FILES = 50
 
 
 def main():
@@ -87,24 +28,28 @@ def main():
     st.markdown("---")
     
     uploaded_files = st.file_uploader(
-        "请选择需要拆分的Excel文件（可多选）。**注意！只支持.xlsx格式！**",
-        type=['xlsx'],
+        "请选择需要拆分的Excel文件（可多选，或上传包含文件夹的zip）。**注意！只支持.xlsx格式！**",
+        type=['xlsx', 'zip'],
         accept_multiple_files=True,
-        help="只支持.xlsx格式以确保样式完整保留，如有.xls文件请先转换为.xlsx",
+        help="只支持.xlsx格式以确保样式完整保留，如有.xls文件请先转换为.xlsx；zip中的目录结构会保留到输出中",
         key=f"uploader_{st.session_state.excel_split_key}"
     )
     
-    if uploaded_files:
-        st.info(f"📊 已选择 {len(uploaded_files)} 个Excel文件")
+    input_files = expand_uploads(uploaded_files or [], ('.xlsx',))
+    if uploaded_files and not input_files:
+        st.warning("⚠️ 未找到.xlsx文件")
+    
+    if input_files:
+        st.info(f"📊 已选择 {len(input_files)} 个Excel文件")
         
-        # Excel-Sheet预览
+        # Excel-Sheet预览（文件较多时只预览前几个）
         st.subheader("📋 Excel-Sheet预览")
         file_info = []
         processable_count = 0
         
-        for file in uploaded_files:
+        for file in input_files[:PREVIEW_MAX_FILES]:
             sheet_count = split_excel_file(file, file.name)
-            size = len(file.getvalue()) / 1024
+            size = file.size / 1024
             
             if sheet_count > 1:
                 processable_count += 1
@@ -113,52 +58,67 @@ def main():
                 status = "⏩ 将跳过(单sheet)"
             else:
                 status = "❌ 读取失败"
-                
+            
             file_info.append([file.name, sheet_count, f"{size:.1f}", status])
         
         df = pd.DataFrame(file_info, columns=['文件名', 'Sheet数量', '大小(KB)', '状态'])
         st.dataframe(df, use_container_width=True, hide_index=True)
+        if len(input_files) > PREVIEW_MAX_FILES:
+            st.caption(f"仅预览前 {PREVIEW_MAX_FILES} 个文件")
         st.success(f"其中 {processable_count} 个文件将被拆分")
         
         if st.button("🔄 开始拆分", type="primary", use_container_width=True, disabled="excel_split_task_running" in st.session_state):
             st.session_state.excel_split_task_running = True
             st.rerun()
         
+        # 超过排队限制，任务未提交
+        if st.session_state.get('excel_split_queue_error'):
+            st.warning(f"⚠️ {st.session_state.pop('excel_split_queue_error')}")
+        
         # 处理任务
         if st.session_state.get('excel_split_task_running') and not st.session_state.get('excel_split_result'):
-            files_data = [(f, f.name) for f in uploaded_files]
-            task_id = fp_queue.submit_task(files_data, process_files_batch)
+            files_data = [(f, f.name) for f in input_files]
+            try:
+                task_id = fp_queue.submit_task(files_data, process_files_batch, meta={'tool': 'excel-split'})
+            except QueueFullError as e:
+                st.session_state.excel_split_queue_error = str(e)
+                st.session_state.pop('excel_split_task_running', None)
+                st.rerun()
             
             # 状态显示
             status_placeholder = st.empty()
             
-            while True:
-                position = fp_queue.get_task_position(task_id)
-                task_status = fp_queue.get_task_status(task_id)
-                
-                if position > 0:
-                    status_placeholder.warning(f"⏳ 排队中，第 {position} 位")
-                elif task_status == "processing":
-                    status_placeholder.info("🔄 正在拆分中...")
-                elif task_status == "completed":
-                    status_placeholder.success("✅ 拆分完成")
-                    zip_buffer, results = fp_queue.wait_for_task(task_id)
-                    break
-                else:
-                    zip_buffer, results = None, None
-                    break
-                
-                time.sleep(1)
+            try:
+                while True:
+                    position = fp_queue.get_task_position(task_id)
+                    task_status = fp_queue.get_task_status(task_id)
+                    
+                    if position > 0:
+                        status_placeholder.warning(f"⏳ 排队中，第 {position} 位")
+                    elif task_status == "processing":
+                        status_placeholder.info("🔄 正在拆分中...")
+                    elif task_status == "completed":
+                        status_placeholder.success("✅ 拆分完成")
+                        writer, results = fp_queue.wait_for_task(task_id)
+                        break
+                    else:
+                        writer, results = None, None
+                        break
+                    
+                    time.sleep(1)
+            finally:
+                # 任务未正常结束时取消（重置页面、其他操作触发重新运行或会话关闭都会中断脚本），正在处理的也会停止
+                fp_queue.cancel_task(task_id)
             
-            if zip_buffer and results:
-                st.session_state.excel_split_result = (zip_buffer, results)
+            if writer and results:
+                st.session_state.excel_split_result = (save_result(writer), results)
                 status_placeholder.empty()
             else:
                 status_placeholder.error("拆分超时，请重试")
         
         # 显示结果
         if st.session_state.get('excel_split_result'):
-            zip_buffer, results = st.session_state.excel_split_result
+            result_handle, results = st.session_state.excel_split_result
             st.success("✅ 拆分完成!")
             
             # 显示结果和统计
@@ -178,15 +138,28 @@ def main():
                 timestamp = datetime.now().strftime("%Y%m%d%H%M")
                 filename = f"excel_sheet_拆分_{timestamp}.zip"
                 
+                available = result_exists(result_handle)
+                if not available:
+                    st.warning("⚠️ 结果文件已过期清理，请重置页面后重新处理")
+                
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.download_button("📥 下载拆分文件", zip_buffer.getvalue(), filename, "application/zip", type="primary", use_container_width=True)
+                    st.download_button("📥 下载拆分文件", partial(read_result, result_handle), filename, "application/zip", type="primary", use_container_width=True, disabled=not available)
                 with col2:
                     if st.button("🔄 重置页面", type="secondary", use_container_width=True):
                         st.session_state.excel_split_key += 1
+                        delete_result(result_handle)
                         st.session_state.pop('excel_split_result', None)
                         st.session_state.pop('excel_split_task_running', None)
                         st.rerun()
+                
+                # 单独下载某个文件，无需下载整个压缩包
+                result_files = list_result_files(result_handle)
+                if len(result_files) > 1:
+                    with st.expander("📄 单独下载文件"):
+                        selected_file = st.selectbox("选择文件", result_files)
+                        st.download_button("📥 下载所选文件", partial(read_result_file, result_handle, selected_file),
+                                           Path(selected_file).name, use_container_width=True)
 
 
 if __name__ == "__main__":
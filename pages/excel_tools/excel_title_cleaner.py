@@ -1,123 +1,19 @@
 import streamlit as st
 import pandas as pd
 import io
-import zipfile
 import time
+from functools import partial
 from pathlib import Path
 from datetime import datetime
 from common.ui_style import apply_custom_style
 from common.file_processing_queue import fp_queue
+from common.task_store import QueueFullError
+from common.result_store import delete_result, list_result_files, read_result, read_result_file, result_exists, save_result
+from common.archive_input import expand_uploads
+from common.processors.excel_title import detect_data_boundary, index_to_excel_col, process_files_batch
 
-
-def excel_col_to_index(col_str):
-    """Excel列名转索引 A->0, B->1"""
-    result = 0
-    for char in col_str.upper():
-        result = result * 26 + (ord(char) - ord('A') + 1)
-    return result - 1
-
-def index_to_excel_col(index):
-    """索引转Excel列名 0->A, 1->B"""
-    result = ""
-    while index >= 0:
-        result = chr(index % 26 + ord('A')) + result
-        index = index // 26 - 1
-    return result
-
-def detect_data_boundary(df):
-    """检测数据边界"""
-    start_col = 0
-    end_col = df.shape[1] - 1
-    body_end_row = df.shape[0]
-    return start_col, end_col, body_end_row
-
-
-def clean_excel_data(df, start_col, end_col, body_end_row, title_check_rows=3, max_value_cols=2, header_rows=2):
-    """清洗指定区域的Excel数据"""
-    # 选择指定区域
-    selected_df = df.iloc[:body_end_row, start_col:end_col+1].copy()
-    
-    # 删除标题行
-    removed_title_rows = 0
-    for i in range(min(title_check_rows, len(selected_df))):
-        if selected_df.iloc[i].notna().sum() <= max_value_cols:
-            removed_title_rows += 1
-        else:
-            break
-    
-    if removed_title_rows > 0:
-        selected_df = selected_df.drop(selected_df.index[:removed_title_rows]).reset_index(drop=True)
-    
-    # 处理表头
-    if len(selected_df) >= header_rows:
-        header_data = [selected_df.iloc[i].ffill() for i in range(header_rows)]
-        new_headers = []
-        for col_idx in range(len(selected_df.columns)):
-            parts = [str(header_data[i].iloc[col_idx]) for i in range(header_rows) 
-                    if pd.notna(header_data[i].iloc[col_idx]) and str(header_data[i].iloc[col_idx])]
-            unique_parts = list(dict.fromkeys(parts))
-            new_headers.append("-".join(unique_parts) if unique_parts else f"Col_{col_idx}")
-        
-        selected_df = selected_df.iloc[header_rows:].copy()
-        if not selected_df.empty:
-            selected_df.columns = new_headers[:len(selected_df.columns)]
-    
-    # 填充左侧合并单元格
-    for col_idx in range(len(selected_df.columns)):
-        col_data = selected_df.iloc[:, col_idx]
-        if col_data.isna().any() and col_data.count() > 0:
-            non_null_ratio = col_data.count() / len(col_data)
-            if non_null_ratio < 0.8 or (col_idx == 0 and pd.notna(col_data.iloc[0])):
-                selected_df.iloc[:, col_idx] = col_data.ffill()
-        elif col_idx > 0 and col_data.count() == len(col_data):
-            break
-    
-    return selected_df
-
-def clean_excel_file(file_data, file_name, zip_writer, title_check_rows=3, max_value_cols=2, header_rows=2):
-    """清洗Excel文件并添加到zip"""
-    df = pd.read_excel(file_data, header=None)
-    start_col, end_col, body_end_row = detect_data_boundary(df)
-    cleaned_df = clean_excel_data(df, start_col, end_col, body_end_row, title_check_rows, max_value_cols, header_rows)
-    
-    # 生成文件
-    base_name = Path(file_name).stem
-    
-    # Excel文件
-    excel_buffer = io.BytesIO()
-    cleaned_df.to_excel(excel_buffer, index=False)
-    zip_writer.writestr(f"excel/{base_name}_clean.xlsx", excel_buffer.getvalue())
-    
-    # JSON文件
-    json_data = cleaned_df.to_json(orient='records', force_ascii=False, indent=2)
-    zip_writer.writestr(f"json/{base_name}_clean.json", json_data)
-    
-    # 返回处理信息
-    boundary_info = f"{index_to_excel_col(start_col)}-{index_to_excel_col(end_col)}列,{body_end_row}行"
-    return boundary_info, df.shape[0], cleaned_df.shape[0]
-
-
-def process_files_batch(files_data):
-    """批处理文件并返回结果"""
-    # 从第一个元素提取参数
-    _, _, title_check_rows, max_value_cols, header_rows = files_data[0]
-    # 提取文件数据
-    files_data = [(f, n) for f, n, *_ in files_data]
-    
-    zip_buffer = io.BytesIO()
-    results = []
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for file_data, file_name in files_data:
-            try:
-                boundary_info, original_rows, final_rows = clean_excel_file(
-                    file_data, file_name, zipf, title_check_rows, max_value_cols, header_rows
-                )
-                results.append([file_name, boundary_info, original_rows, final_rows, "✅ 成功"])
-            except Exception as e:
-                results.append([file_name, "处理失败", 0, 0, f"❌ {str(e)[:15]}..."])
-    
-    return zip_buffer, results
+# 文件较多时只预览前几个，避免每次页面刷新都读取全部文件
+PREVIEW_MAX_FILES = 50
 
 
 def main():
@@ -145,26 +41,34 @@ def main():
             sub_col1, sub_col2 = st.columns(2)
             title_check_rows = sub_col1.number_input("标题检测行数", 1, 10, 3, help="检查前几行作为标题删除")  
             max_value_cols = sub_col2.number_input("标题最大含值列数", 1, 5, 2, help="标题行最多包含几列有值")
+            compact = st.checkbox("压缩数据类型", value=False, help="低重复度文本列转为分类、数值列降位（数值占95%以上的列中夹杂的文字视为缺失值），大表处理更省内存")
+            merge_label = st.selectbox("合并输出", ["不合并", "合并为CSV", "合并为Parquet"],
+                                       help="将所有文件的清洗结果按统一表头合并为一个数据集，并增加来源文件列")
+            merge_format = {"合并为CSV": "csv", "合并为Parquet": "parquet"}.get(merge_label, "")
     
     # 文件上传
     uploaded_files = st.file_uploader(
-        "请选择需要清洗的Excel文件（可多选）。**注意！只支持.xlsx格式！**",
-        type=['xlsx'],
+        "请选择需要清洗的Excel文件（可多选，或上传包含文件夹的zip）。**注意！只支持.xlsx格式！**",
+        type=['xlsx', 'zip'],
         accept_multiple_files=True,
-        help="只支持.xlsx格式以确保处理质量，如有.xls文件请先转换为.xlsx",
+        help="只支持.xlsx格式以确保处理质量，如有.xls文件请先转换为.xlsx；zip中的目录结构会保留到输出中",
         key=f"uploader_{st.session_state.excel_title_key}"
     )
-   
-    if uploaded_files:
-        st.info(f"📊 已选择 {len(uploaded_files)} 个Excel文件")
+    
+    input_files = expand_uploads(uploaded_files or [], ('.xlsx',))
+    if uploaded_files and not input_files:
+        st.warning("⚠️ 未找到.xlsx文件")
+    
+    if input_files:
+        st.info(f"📊 已选择 {len(input_files)} 个Excel文件")
         
-        # Excel预览（只显示边界检测）
+        # Excel预览（只显示边界检测，文件较多时只预览前几个）
         st.subheader("📋 处理预览")
         file_info = []
         
-        for file in uploaded_files:
+        for file in input_files[:PREVIEW_MAX_FILES]:
             try:
-                df = pd.read_excel(file, header=None, nrows=50)  # 只读50行用于边界检测
+                df = pd.read_excel(io.BytesIO(file.getvalue()), header=None, nrows=50)  # 只读50行用于边界检测
                 start_col, end_col, _ = detect_data_boundary(df)
                 boundary_info = f"{index_to_excel_col(start_col)}-{index_to_excel_col(end_col)}列"
                 file_info.append([file.name, boundary_info, df.shape[0], df.shape[1]])
@@ -173,48 +77,63 @@ def main():
         
         df_preview = pd.DataFrame(file_info, columns=['文件名', '检测边界', '行数', '列数'])
         st.dataframe(df_preview, use_container_width=True, hide_index=True)
+        if len(input_files) > PREVIEW_MAX_FILES:
+            st.caption(f"仅预览前 {PREVIEW_MAX_FILES} 个文件")
         
         if st.button("🧹 开始清洗", type="primary", use_container_width=True, disabled="excel_title_task_running" in st.session_state):
             st.session_state.excel_title_task_running = True
             st.rerun()
         
+        # 超过排队限制，任务未提交
+        if st.session_state.get('excel_title_queue_error'):
+            st.warning(f"⚠️ {st.session_state.pop('excel_title_queue_error')}")
+        
         # 处理任务
         if st.session_state.get('excel_title_task_running') and not st.session_state.get('excel_title_result'):
-            files_data = [(f, f.name, title_check_rows, max_value_cols, header_rows) for f in uploaded_files]
-            task_id = fp_queue.submit_task(files_data, process_files_batch)
+            files_data = [(f, f.name, title_check_rows, max_value_cols, header_rows, compact, merge_format) for f in input_files]
+            try:
+                task_id = fp_queue.submit_task(files_data, process_files_batch, meta={'tool': 'excel-title'})
+            except QueueFullError as e:
+                st.session_state.excel_title_queue_error = str(e)
+                st.session_state.pop('excel_title_task_running', None)
+                st.rerun()
             
             # 状态显示
             status_placeholder = st.empty()
             
-            while True:
-                position = fp_queue.get_task_position(task_id)
-                task_status = fp_queue.get_task_status(task_id)
-                
-                if position > 0:
-                    status_placeholder.warning(f"⏳ 排队中，第 {position} 位")
-                elif task_status == "processing":
-                    status_placeholder.info("🧹 正在清洗中...")
-                elif task_status == "completed":
-                    status_placeholder.success("✅ 清洗完成")
-                    zip_buffer, results = fp_queue.wait_for_task(task_id)
-                    break
-                else:
-                    zip_buffer, results = None, None
-                    break
-                
-                time.sleep(1)
+            try:
+                while True:
+                    position = fp_queue.get_task_position(task_id)
+                    task_status = fp_queue.get_task_status(task_id)
+                    
+                    if position > 0:
+                        status_placeholder.warning(f"⏳ 排队中，第 {position} 位")
+                    elif task_status == "processing":
+                        status_placeholder.info("🧹 正在清洗中...")
+                    elif task_status == "completed":
+                        status_placeholder.success("✅ 清洗完成")
+                        writer, results = fp_queue.wait_for_task(task_id)
+                        break
+                    else:
+                        writer, results = None, None
+                        break
+                    
+                    time.sleep(1)
+            finally:
+                # 任务未正常结束时取消（重置页面、其他操作触发重新运行或会话关闭都会中断脚本），正在处理的也会停止
+                fp_queue.cancel_task(task_id)
             
-            if zip_buffer and results:
-                st.session_state.excel_title_result = (zip_buffer, results)
+            if writer and results:
+                st.session_state.excel_title_result = (save_result(writer), results)
                 status_placeholder.empty()
             else:
                 status_placeholder.error("清洗超时，请重试")
         
         # 显示结果
         if st.session_state.get('excel_title_result'):
-            zip_buffer, results = st.session_state.excel_title_result
+            result_handle, results = st.session_state.excel_title_result
             success_count = sum(1 for r in results if r and len(r) > 4 and r[4] and r[4].startswith('✅'))
-            failed_count = len(results) - success_count
+            failed_count = sum(1 for r in results if r and len(r) > 4 and r[4] and r[4].startswith('❌'))
             
             st.success("✅ 清洗完成!")
             st.dataframe(pd.DataFrame(results, columns=['文件名', '处理区域', '原始行数', '最终行数', '状态']), 
@@ -229,18 +148,34 @@ def main():
                 timestamp = datetime.now().strftime("%Y%m%d%H%M")
                 filename = f"excel_标题清洗_{timestamp}.zip"
                 
+                available = result_exists(result_handle)
+                if not available:
+                    st.warning("⚠️ 结果文件已过期清理，请重置页面后重新处理")
+                
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.download_button("📥 下载清洗文件", zip_buffer.getvalue(), filename, "application/zip", 
-                                     type="primary", use_container_width=True)
+                    st.download_button("📥 下载清洗文件", partial(read_result, result_handle), filename, "application/zip", 
+                                     type="primary", use_container_width=True, disabled=not available)
                 with col2:
                     if st.button("🔄 重置页面", type="secondary", use_container_width=True):
                         st.session_state.excel_title_key += 1
+                        delete_result(result_handle)
                         st.session_state.pop('excel_title_result', None)
                         st.session_state.pop('excel_title_task_running', None)
                         st.rerun()
                 
-                st.info("💡 已将Excel和JSON文件分别放在excel和json文件夹中")
+                # 单独下载某个文件，无需下载整个压缩包
+                result_files = list_result_files(result_handle)
+                if len(result_files) > 1:
+                    with st.expander("📄 单独下载文件"):
+                        selected_file = st.selectbox("选择文件", result_files)
+                        st.download_button("📥 下载所选文件", partial(read_result_file, result_handle, selected_file),
+                                           Path(selected_file).name, use_container_width=True)
+                
+                if any(r[4].startswith('📦') for r in results):
+                    st.info("💡 已将所有清洗结果合并到merged文件夹中")
+                else:
+                    st.info("💡 已将Excel和JSON文件分别放在excel和json文件夹中")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
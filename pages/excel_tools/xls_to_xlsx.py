@@ -1,12 +1,15 @@
 import streamlit as st
-import io
-import zipfile
 import pandas as pd
 import time
+from functools import partial
 from pathlib import Path
 from datetime import datetime
 from common.ui_style import apply_custom_style
 from common.libreoffice_queue import lo_queue
+from common.task_store import QueueFullError
+from common.result_store import delete_result, list_result_files, read_result, read_result_file, result_exists, save_result
+from common.archive_input import expand_uploads
+from common.processors.libreoffice import write_results
 
 
 def main():
@@ -22,67 +25,74 @@ def main():
     st.markdown("---")
     
     uploaded_files = st.file_uploader(
-        "选择XLS文件进行转换（可多选）",
-        type=['xls'],
+        "选择XLS文件进行转换（可多选，或上传包含文件夹的zip）",
+        type=['xls', 'zip'],
         accept_multiple_files=True,
-        help="支持单个或多个 .xls 文件上传，使用 LibreOffice 转换引擎",
+        help="支持单个或多个 .xls 文件上传，使用 LibreOffice 转换引擎；zip中的目录结构会保留到输出中",
         key=f"uploader_{st.session_state.xls_xlsx_key}"
     )
     
-    if uploaded_files:
-        file_count = len(uploaded_files)
+    input_files = expand_uploads(uploaded_files or [], ('.xls',))
+    if uploaded_files and not input_files:
+        st.warning("⚠️ 未找到XLS文件")
+    
+    if input_files:
+        file_count = len(input_files)
         st.info(f"📊 已选择 {file_count} 个XLS文件")
         
         if st.button("🔄 开始转换", type="primary", use_container_width=True, disabled="xls_xlsx_task_running" in st.session_state):
             st.session_state.xls_xlsx_task_running = True
             st.rerun()
         
+        # 超过排队限制，任务未提交
+        if st.session_state.get('xls_xlsx_queue_error'):
+            st.warning(f"⚠️ {st.session_state.pop('xls_xlsx_queue_error')}")
+        
         # 处理任务
         if st.session_state.get('xls_xlsx_task_running') and not st.session_state.get('xls_xlsx_result'):
-            files_data = [(file.name, file.getvalue()) for file in uploaded_files]
-            task_id = lo_queue.submit_task(files_data, 'xls', 'xlsx')
+            files_data = [(file.name, file) for file in input_files]
+            try:
+                task_id = lo_queue.submit_task(files_data, 'xls', 'xlsx')
+            except QueueFullError as e:
+                st.session_state.xls_xlsx_queue_error = str(e)
+                st.session_state.pop('xls_xlsx_task_running', None)
+                st.rerun()
             
             # 状态显示
             status_placeholder = st.empty()
             
-            while True:
-                position = lo_queue.get_task_position(task_id)
-                task_status = lo_queue.get_task_status(task_id)
-                
-                if position > 0:
-                    status_placeholder.warning(f"⏳ 排队中，第 {position} 位")
-                elif task_status == "processing":
-                    status_placeholder.info("🔄 正在转换中...")
-                elif task_status == "completed":
-                    status_placeholder.success("✅ 转换完成")
-                    conversion_results = lo_queue.wait_for_task(task_id)
-                    break
-                else:
-                    conversion_results = None
-                    break
-                
-                time.sleep(1)
+            try:
+                while True:
+                    position = lo_queue.get_task_position(task_id)
+                    task_status = lo_queue.get_task_status(task_id)
+                    
+                    if position > 0:
+                        status_placeholder.warning(f"⏳ 排队中，第 {position} 位")
+                    elif task_status == "processing":
+                        status_placeholder.info("🔄 正在转换中...")
+                    elif task_status == "completed":
+                        status_placeholder.success("✅ 转换完成")
+                        conversion_results = lo_queue.wait_for_task(task_id)
+                        break
+                    else:
+                        conversion_results = None
+                        break
+                    
+                    time.sleep(1)
+            finally:
+                # 任务未正常结束时取消（重置页面、其他操作触发重新运行或会话关闭都会中断脚本），正在处理的也会停止
+                lo_queue.cancel_task(task_id)
             
             if conversion_results:
-                zip_buffer = io.BytesIO()
-                results = []
-                
-                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for filename, content, error in conversion_results:
-                        if content:
-                            zipf.writestr(f"{Path(filename).stem}.xlsx", content)
-                            results.append([filename, '✅ 转换成功'])
-                        else:
-                            results.append([filename, f'❌ {error}'])
-                
-                st.session_state.xls_xlsx_result = (zip_buffer, results)
+                writer, results = write_results(conversion_results, 'xlsx')
+                st.session_state.xls_xlsx_result = (save_result(writer), results)
                 status_placeholder.empty()
             else:
                 status_placeholder.error("转换超时，请重试")
         
         # 显示结果
         if st.session_state.get('xls_xlsx_result'):
-            zip_buffer, results = st.session_state.xls_xlsx_result
+            result_handle, results = st.session_state.xls_xlsx_result
             success_count = sum(1 for r in results if r[1].startswith('✅'))
             
             st.success("✅ 转换完成!")
@@ -94,17 +104,30 @@ def main():
             
             if success_count > 0:
                 timestamp = datetime.now().strftime("%Y%m%d%H%M")
-                filename = f"xls_to_xlsx_转换_{timestamp}.zip" if file_count > 1 else f"{Path(uploaded_files[0].name).stem}_{timestamp}.zip"
+                filename = f"xls_to_xlsx_转换_{timestamp}.zip" if file_count > 1 else f"{Path(input_files[0].name).stem}_{timestamp}.zip"
+                
+                available = result_exists(result_handle)
+                if not available:
+                    st.warning("⚠️ 结果文件已过期清理，请重置页面后重新处理")
                 
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.download_button("📥 下载转换文件", zip_buffer.getvalue(), filename, "application/zip", type="primary", use_container_width=True)
+                    st.download_button("📥 下载转换文件", partial(read_result, result_handle), filename, "application/zip", type="primary", use_container_width=True, disabled=not available)
                 with col2:
                     if st.button("🔄 重置页面", type="secondary", use_container_width=True):
                         st.session_state.xls_xlsx_key += 1
+                        delete_result(result_handle)
                         st.session_state.pop('xls_xlsx_result', None)
                         st.session_state.pop('xls_xlsx_task_running', None)
                         st.rerun()
+                
+                # 单独下载某个文件，无需下载整个压缩包
+                result_files = list_result_files(result_handle)
+                if len(result_files) > 1:
+                    with st.expander("📄 单独下载文件"):
+                        selected_file = st.selectbox("选择文件", result_files)
+                        st.download_button("📥 下载所选文件", partial(read_result_file, result_handle, selected_file),
+                                           Path(selected_file).name, use_container_width=True)
 
 
 if __name__ == "__main__":
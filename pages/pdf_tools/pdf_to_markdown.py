@@ -1,58 +1,77 @@
 import streamlit as st
-import io
-import zipfile
 import pandas as pd
 import time
+from functools import partial
 from pathlib import Path
 from datetime import datetime
 from common.ui_style import apply_custom_style
 from common.file_processing_queue import fp_queue
+from common.task_store import QueueFullError
+from common.pdf_converter import estimate_convert_seconds, parse_page_range, parse_page_spans, triage_pdf
+from common.result_store import delete_result, list_result_files, read_result, read_result_file, result_exists, save_result
+from common.archive_input import expand_uploads
+from common.processors.pdf_markdown import process_files_batch
 
-def convert_pdf_to_markdown_safe(pdf_content, filename):
-    """安全地转PDF为Markdown，防止临时文件冲突"""
-    try:
-        import pymupdf4llm
-        import os
-        import tempfile
-        import uuid
-        
-        # 使用UUID保证临时文件名唯一
-        unique_id = str(uuid.uuid4())
-        with tempfile.NamedTemporaryFile(suffix=f'_{unique_id}.pdf', delete=False) as temp_file:
-            temp_pdf = temp_file.name
-            temp_file.write(pdf_content)
+# 文件较多时只预检前几个，避免每次页面刷新都读取全部文件
+TRIAGE_MAX_FILES = 50
+
+
+def show_partial(placeholder, partial_info):
+    """显示已完成的文件和当前文件的转换预览"""
+    with placeholder.container():
+        if partial_info.get('results'):
+            st.dataframe(pd.DataFrame(partial_info['results'], columns=['文件名', '状态']), use_container_width=True, hide_index=True)
+        if partial_info.get('preview'):
+            st.caption(f"📄 {partial_info['current']} 预览（最近转换的内容）")
+            st.code(partial_info['preview'], language='markdown')
+
+def triage_uploads(uploaded_files, options):
+    """预检上传的PDF（结果按文件缓存），返回预览表行和任务预估信息"""
+    cache = st.session_state.setdefault('pdf_md_triage', {})
+    rows = []
+    meta = {'pages': 0, 'estimated_seconds': 0.0}
+    for file in uploaded_files[:TRIAGE_MAX_FILES]:
+        if file.file_id not in cache:
+            try:
+                cache[file.file_id] = triage_pdf(file.getvalue())
+            except Exception:
+                cache[file.file_id] = None
+        triage = cache[file.file_id]
+        if triage is None:
+            rows.append([file.name, None, '', '', '', '❌ 无法读取PDF'])
+            continue
         
         try:
-            markdown_content = pymupdf4llm.to_markdown(temp_pdf)
-            return markdown_content, None
-        except Exception as e:
-            return None, str(e)[:20]
-        finally:
-            if os.path.exists(temp_pdf):
-                os.remove(temp_pdf)
+            page_count = len(parse_page_range(options['page_range'], triage['page_count']))
+        except ValueError:
+            page_count = 0
+        seconds = estimate_convert_seconds(triage, options['mode'], page_count)
+        meta['pages'] += page_count
+        meta['estimated_seconds'] += seconds
+        
+        if triage['encrypted']:
+            note = '🔒 已加密，无法转换'
+        elif triage['scanned']:
+            note = '⚠️ 疑似扫描件/纯图片，结果可能为空'
+        elif not page_count:
+            note = '⚠️ 页码范围超出文档页数'
+        else:
+            note = '✅'
+        rows.append([file.name, triage['page_count'], f"{triage['text_ratio']:.0%}", f"{triage['image_ratio']:.0%}",
+                     format_duration(seconds), note])
     
-    except ImportError:
-        return None, "缺少pymupdf4llm库"
-    except Exception as e:
-        return None, str(e)[:20]
+    # 超出预检数量的文件按已预检文件的平均值估算
+    if len(uploaded_files) > TRIAGE_MAX_FILES:
+        scale = len(uploaded_files) / TRIAGE_MAX_FILES
+        meta = {'pages': round(meta['pages'] * scale), 'estimated_seconds': meta['estimated_seconds'] * scale}
+    return rows, meta
 
-def process_files_batch(files_data):
-    """批处理PDF文件并返回结果"""
-    zip_buffer = io.BytesIO()
-    results = []
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for file_name, file_content in files_data:
-            markdown_content, error = convert_pdf_to_markdown_safe(file_content, file_name)
-            
-            if markdown_content:
-                md_filename = f"{Path(file_name).stem}.md"
-                zipf.writestr(md_filename, markdown_content.encode('utf-8'))
-                results.append([file_name, '✅ 转换成功'])
-            else:
-                results.append([file_name, f'❌ {error}'])
-    
-    return zip_buffer, results
+def format_duration(seconds):
+    if seconds < 1:
+        return "<1秒"
+    if seconds < 60:
+        return f"约{seconds:.0f}秒"
+    return f"约{seconds / 60:.0f}分钟"
 
 def main():
     st.set_page_config(page_title="PDF 转 Markdown 工具", page_icon="📋", layout="centered")
@@ -66,80 +85,161 @@ def main():
     st.markdown("将 PDF 文件转换为 Markdown 格式")
     st.markdown("---")
     
+    # 转换选项
+    mode_labels = {"自动（推荐）": "auto", "完整版面分析": "full", "快速文本提取": "fast"}
+    mode_label = st.selectbox("⚙️ 转换模式", list(mode_labels),
+                              help="自动：纯文本页走快速提取，含表格/图片/多栏的页走完整分析；也可强制全部使用某一种方式")
+    page_range = st.text_input("📑 页码范围", placeholder="如 1-20, 25, 30-（留空为全部页）",
+                               help="只转换指定页，页码从1开始，对每个文件生效")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        ignore_images = st.checkbox("🖼️ 跳过图片", value=False)
+    with col2:
+        ignore_graphics = st.checkbox("📐 跳过矢量图形", value=False)
+    with col3:
+        skip_tables = st.checkbox("📊 跳过表格识别", value=False, help="表格内容按普通文字输出，转换更快")
+    options = {
+        'mode': mode_labels[mode_label],
+        'page_range': page_range,
+        'ignore_images': ignore_images,
+        'ignore_graphics': ignore_graphics,
+        'detect_tables': not skip_tables,
+    }
+    
+    # 校验页码范围格式，是否超出页数在转换时按各文件检查
+    range_error = None
+    try:
+        parse_page_spans(page_range)
+    except ValueError as e:
+        range_error = str(e)
+    
     uploaded_files = st.file_uploader(
-        "选择PDF文件进行转换（可多选）",
-        type=['pdf'],
+        "选择PDF文件进行转换（可多选，或上传包含文件夹的zip）",
+        type=['pdf', 'zip'],
         accept_multiple_files=True,
-        help="支持单个或多个 PDF 文件上传，使用 pymupdf4llm 转换引擎",
+        help="支持单个或多个 PDF 文件上传，使用 pymupdf4llm 转换引擎；zip中的目录结构会保留到输出中",
         key=f"uploader_{st.session_state.pdf_md_key}"
     )
     
-    if uploaded_files:
-        file_count = len(uploaded_files)
+    input_files = expand_uploads(uploaded_files or [], ('.pdf',))
+    if uploaded_files and not input_files:
+        st.warning("⚠️ 未找到PDF文件")
+    
+    if input_files:
+        file_count = len(input_files)
         st.info(f"📋 已选择 {file_count} 个PDF文件")
         
-        if st.button("🔄 开始转换", type="primary", use_container_width=True, disabled="pdf_md_task_running" in st.session_state):
+        # 预检：页数、文字层、图片占比和预计耗时
+        triage_rows, task_meta = triage_uploads(input_files, options)
+        st.dataframe(pd.DataFrame(triage_rows, columns=['文件名', '页数', '文字层', '含图片页', '预计耗时', '提示']),
+                     use_container_width=True, hide_index=True)
+        if file_count > TRIAGE_MAX_FILES:
+            st.caption(f"仅预检前 {TRIAGE_MAX_FILES} 个文件，其余文件按平均值估算")
+        st.caption(f"⏱️ 预计转换耗时{format_duration(task_meta['estimated_seconds'])}（不含排队时间）")
+        if any(row[5].startswith('⚠️ 疑似扫描件') for row in triage_rows):
+            st.warning("⚠️ 部分文件没有文字层（扫描件或纯图片），转换结果可能为空，建议使用OCR工具（如MinerU）处理")
+        
+        if range_error:
+            st.warning(f"⚠️ {range_error}")
+        elif st.button("🔄 开始转换", type="primary", use_container_width=True, disabled="pdf_md_task_running" in st.session_state):
             st.session_state.pdf_md_task_running = True
             st.rerun()
         
+        # 超过排队限制，任务未提交
+        if st.session_state.get('pdf_md_queue_error'):
+            st.warning(f"⚠️ {st.session_state.pop('pdf_md_queue_error')}")
+        
         # 处理任务
         if st.session_state.get('pdf_md_task_running') and not st.session_state.get('pdf_md_result'):
-            files_data = [(file.name, file.getvalue()) for file in uploaded_files]
-            task_id = fp_queue.submit_task(files_data, process_files_batch)
+            files_data = [(file.name, file, options) for file in input_files]
+            try:
+                task_id = fp_queue.submit_task(files_data, process_files_batch, meta=dict(task_meta, tool='pdf-markdown'))
+            except QueueFullError as e:
+                st.session_state.pdf_md_queue_error = str(e)
+                st.session_state.pop('pdf_md_task_running', None)
+                st.rerun()
             
             # 状态显示
             status_placeholder = st.empty()
+            partial_placeholder = st.empty()
             
-            while True:
-                position = fp_queue.get_task_position(task_id)
-                task_status = fp_queue.get_task_status(task_id)
-                
-                if position > 0:
-                    status_placeholder.warning(f"⏳ 排队中，第 {position} 位")
-                elif task_status == "processing":
-                    status_placeholder.info("🔄 正在转换中...")
-                elif task_status == "completed":
-                    status_placeholder.success("✅ 转换完成")
-                    zip_buffer, results = fp_queue.wait_for_task(task_id)
-                    break
-                else:
-                    zip_buffer, results = None, None
-                    break
-                
-                time.sleep(1)
+            try:
+                while True:
+                    position = fp_queue.get_task_position(task_id)
+                    task_status = fp_queue.get_task_status(task_id)
+                    
+                    if position > 0:
+                        status_placeholder.warning(f"⏳ 排队中，第 {position} 位")
+                    elif task_status == "processing":
+                        partial_info = fp_queue.get_task_partial(task_id) or {}
+                        progress = fp_queue.get_task_progress(task_id)
+                        files_text = f"（已完成 {progress[0]}/{progress[1]} 个文件）" if progress else ""
+                        pages_text = f" {partial_info['current']} 第 {partial_info['pages'][0]}/{partial_info['pages'][1]} 页" if partial_info.get('pages') else ""
+                        status_placeholder.info(f"🔄 正在转换中...{pages_text}{files_text}")
+                        show_partial(partial_placeholder, partial_info)
+                    elif task_status == "completed":
+                        status_placeholder.success("✅ 转换完成")
+                        writer, results = fp_queue.wait_for_task(task_id)
+                        break
+                    else:
+                        writer, results = None, None
+                        break
+                    
+                    time.sleep(1)
+            finally:
+                # 任务未正常结束时取消（重置页面、其他操作触发重新运行或会话关闭都会中断脚本），正在处理的也会停止
+                fp_queue.cancel_task(task_id)
             
-            if zip_buffer and results:
-                st.session_state.pdf_md_result = (zip_buffer, results)
+            partial_placeholder.empty()
+            if writer and results:
+                st.session_state.pdf_md_result = (save_result(writer), results)
                 status_placeholder.empty()
             else:
                 status_placeholder.error("转换超时，请重试")
         
         # 显示结果
         if st.session_state.get('pdf_md_result'):
-            zip_buffer, results = st.session_state.pdf_md_result
+            result_handle, results = st.session_state.pdf_md_result
             success_count = sum(1 for r in results if r[1].startswith('✅'))
+            partial_count = sum(1 for r in results if r[1].startswith('⚠️'))
             
             st.success("✅ 转换完成!")
             st.dataframe(pd.DataFrame(results, columns=['文件名', '状态']), use_container_width=True, hide_index=True)
             
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             col1.metric("转换成功", success_count)
-            col2.metric("转换失败", len(results) - success_count)
+            col2.metric("部分完成", partial_count)
+            col3.metric("转换失败", len(results) - success_count - partial_count)
             
-            if success_count > 0:
+            # 部分完成的文件保留了已转换的页，同样可以下载
+            if success_count + partial_count > 0:
                 timestamp = datetime.now().strftime("%Y%m%d%H%M")
-                filename = f"pdf_to_markdown_转换_{timestamp}.zip" if file_count > 1 else f"{Path(uploaded_files[0].name).stem}_{timestamp}.zip"
+                filename = f"pdf_to_markdown_转换_{timestamp}.zip" if file_count > 1 else f"{Path(input_files[0].name).stem}_{timestamp}.zip"
+                
+                available = result_exists(result_handle)
+                if not available:
+                    st.warning("⚠️ 结果文件已过期清理，请重置页面后重新处理")
                 
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.download_button("📥 下载转换文件", zip_buffer.getvalue(), filename, "application/zip", type="primary", use_container_width=True)
+                    st.download_button("📥 下载转换文件", partial(read_result, result_handle), filename, "application/zip", type="primary", use_container_width=True, disabled=not available)
                 with col2:
                     if st.button("🔄 重置页面", type="secondary", use_container_width=True):
                         st.session_state.pdf_md_key += 1
+                        delete_result(result_handle)
                         st.session_state.pop('pdf_md_result', None)
                         st.session_state.pop('pdf_md_task_running', None)
+                        st.session_state.pop('pdf_md_triage', None)
                         st.rerun()
                 
+                # 单独下载某个文件，无需下载整个压缩包
+                result_files = list_result_files(result_handle)
+                if len(result_files) > 1:
+                    with st.expander("📄 单独下载文件"):
+                        selected_file = st.selectbox("选择文件", result_files)
+                        st.download_button("📥 下载所选文件", partial(read_result_file, result_handle, selected_file),
+                                           Path(selected_file).name, use_container_width=True)
+                
                 st.markdown("**如对转换效果不满意（复杂PDF），请跳转[MinerU](https://mineru.net/OpenSourceTools/Extractor)**")
 
 
@@ -1,11 +1,16 @@
 import streamlit as st
-import io
-import zipfile
 import pandas as pd
-
+import time
+from functools import partial
 from pathlib import Path
 from datetime import datetime
 from common.ui_style import apply_custom_style
+from common.file_processing_queue import fp_queue
+from common.task_store import QueueFullError
+from common.result_store import delete_result, list_result_files, read_result, read_result_file, result_exists, save_result
+from common.archive_input import expand_uploads
+from common.processors.word_clean import process_files_batch
+
 
 def main():
     st.set_page_config(page_title="Word DOCX 清理工具", page_icon="🧹", layout="centered")
@@ -15,7 +20,7 @@ def main():
         st.session_state.word_clean_key = 0
     
     st.title("🧹 Word DOCX 清理工具")
-    st.markdown("清理 DOCX 文件中的页眉和页脚元素")
+    st.markdown("清理 DOCX 文件中的页眉页脚、批注、修订记录、隐藏文字和文档属性")
     st.markdown("---")
     
     # 清理选项
@@ -25,68 +30,97 @@ def main():
         remove_headers = st.checkbox("✂️ 去除页眉", value=True)
     with col2:
         remove_footers = st.checkbox("✂️ 去除页脚", value=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        remove_comments = st.checkbox("💬 删除批注", value=False)
+        remove_hidden_text = st.checkbox("👻 删除隐藏文字", value=False)
+    with col2:
+        accept_revisions = st.checkbox("📝 接受所有修订", value=False, help="保留插入内容、丢弃删除内容，并关闭修订跟踪")
+        remove_properties = st.checkbox("🏷️ 清除文档属性", value=False, help="清空作者、标题、公司等核心和自定义属性")
+    options = {
+        'remove_headers': remove_headers,
+        'remove_footers': remove_footers,
+        'remove_comments': remove_comments,
+        'accept_revisions': accept_revisions,
+        'remove_hidden_text': remove_hidden_text,
+        'remove_properties': remove_properties,
+    }
     
     st.markdown("---")
     
     uploaded_files = st.file_uploader(
-        "选择DOCX文件进行清理（可多选）",
-        type=['docx'],
+        "选择DOCX文件进行清理（可多选，或上传包含文件夹的zip）",
+        type=['docx', 'zip'],
         accept_multiple_files=True,
-        help="支持单个或多个 .docx 文件上传，将清理页眉和页脚元素",
+        help="支持单个或多个 .docx 文件上传，所有选中的清理项在一次处理中完成；zip中的目录结构会保留到输出中",
         key=f"uploader_{st.session_state.word_clean_key}"
     )
     
-    if uploaded_files:
-        file_count = len(uploaded_files)
+    input_files = expand_uploads(uploaded_files or [], ('.docx',))
+    if uploaded_files and not input_files:
+        st.warning("⚠️ 未找到DOCX文件")
+    
+    if input_files:
+        file_count = len(input_files)
         st.info(f"📄 已选择 {file_count} 个DOCX文件")
         
         # 检查是否选择了任何清理选项
-        if not (remove_headers or remove_footers):
+        if not any(options.values()):
             st.warning("⚠️ 请至少选择一个清理选项")
-        else:
-            if st.button("🧹 开始清理", type="primary", use_container_width=True):
-                status_placeholder = st.empty()
-                status_placeholder.info("🧹 正在清理中...")
-                
-                # 直接处理文件，不需要额外的函数抽象
-                zip_buffer = io.BytesIO()
-                results = []
-                
-                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for uploaded_file in uploaded_files:
-                        try:
-                            # 直接用python-docx处理，无需复杂的解压重打包
-                            from docx import Document
-                            
-                            # 从上传文件创建Document对象
-                            doc = Document(io.BytesIO(uploaded_file.getvalue()))
-                            
-                            # 清理页眉页脚
-                            for section in doc.sections:
-                                if remove_headers:
-                                    section.header.is_linked_to_previous = True
-                                if remove_footers:
-                                    section.footer.is_linked_to_previous = True
-                            
-                            # 保存到内存
-                            cleaned_buffer = io.BytesIO()
-                            doc.save(cleaned_buffer)
-                            cleaned_content = cleaned_buffer.getvalue()
-                            
-                            # 添加到zip
-                            clean_filename = f"{Path(uploaded_file.name).stem}_cleaned.docx"
-                            zipf.writestr(clean_filename, cleaned_content)
-                            results.append([uploaded_file.name, '✅ 清理成功'])
-                            
-                        except Exception as e:
-                            results.append([uploaded_file.name, f'❌ {str(e)[:50]}'])
-                
-                st.session_state.word_clean_result = (zip_buffer, results)
+        elif st.button("🧹 开始清理", type="primary", use_container_width=True, disabled="word_clean_task_running" in st.session_state):
+            st.session_state.word_clean_task_running = True
+            st.rerun()
+        
+        # 超过排队限制，任务未提交
+        if st.session_state.get('word_clean_queue_error'):
+            st.warning(f"⚠️ {st.session_state.pop('word_clean_queue_error')}")
+        
+        # 处理任务
+        if st.session_state.get('word_clean_task_running') and not st.session_state.get('word_clean_result'):
+            files_data = [(file.name, file, options) for file in input_files]
+            try:
+                task_id = fp_queue.submit_task(files_data, process_files_batch, meta={'tool': 'word-clean'})
+            except QueueFullError as e:
+                st.session_state.word_clean_queue_error = str(e)
+                st.session_state.pop('word_clean_task_running', None)
+                st.rerun()
+            
+            # 状态显示
+            status_placeholder = st.empty()
+            
+            try:
+                while True:
+                    position = fp_queue.get_task_position(task_id)
+                    task_status = fp_queue.get_task_status(task_id)
+                    
+                    if position > 0:
+                        status_placeholder.warning(f"⏳ 排队中，第 {position} 位")
+                    elif task_status == "processing":
+                        progress = fp_queue.get_task_progress(task_id)
+                        progress_text = f"（{progress[0]}/{progress[1]}）" if progress else ""
+                        status_placeholder.info(f"🧹 正在清理中...{progress_text}")
+                    elif task_status == "completed":
+                        status_placeholder.success("✅ 清理完成")
+                        writer, results = fp_queue.wait_for_task(task_id)
+                        break
+                    else:
+                        writer, results = None, None
+                        break
+                    
+                    time.sleep(1)
+            finally:
+                # 任务未正常结束时取消（重置页面、其他操作触发重新运行或会话关闭都会中断脚本），正在处理的也会停止
+                fp_queue.cancel_task(task_id)
+            
+            if writer and results:
+                st.session_state.word_clean_result = (save_result(writer), results)
                 status_placeholder.empty()
+            else:
+                status_placeholder.error("清理超时，请重试")
         
         # 显示结果
         if st.session_state.get('word_clean_result'):
-            zip_buffer, results = st.session_state.word_clean_result
+            result_handle, results = st.session_state.word_clean_result
             success_count = sum(1 for r in results if r[1].startswith('✅'))
             
             st.success("✅ 清理完成!")
@@ -98,16 +132,30 @@ def main():
             
             if success_count > 0:
                 timestamp = datetime.now().strftime("%Y%m%d%H%M")
-                filename = f"docx_cleaned_{timestamp}.zip" if file_count > 1 else f"{Path(uploaded_files[0].name).stem}_cleaned_{timestamp}.zip"
+                filename = f"docx_cleaned_{timestamp}.zip" if file_count > 1 else f"{Path(input_files[0].name).stem}_cleaned_{timestamp}.zip"
+                
+                available = result_exists(result_handle)
+                if not available:
+                    st.warning("⚠️ 结果文件已过期清理，请重置页面后重新处理")
                 
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.download_button("📥 下载清理文件", zip_buffer.getvalue(), filename, "application/zip", type="primary", use_container_width=True)
+                    st.download_button("📥 下载清理文件", partial(read_result, result_handle), filename, "application/zip", type="primary", use_container_width=True, disabled=not available)
                 with col2:
                     if st.button("🔄 重置页面", type="secondary", use_container_width=True):
                         st.session_state.word_clean_key += 1
-                        del st.session_state.word_clean_result
+                        delete_result(result_handle)
+                        st.session_state.pop('word_clean_result', None)
+                        st.session_state.pop('word_clean_task_running', None)
                         st.rerun()
+                
+                # 单独下载某个文件，无需下载整个压缩包
+                result_files = list_result_files(result_handle)
+                if len(result_files) > 1:
+                    with st.expander("📄 单独下载文件"):
+                        selected_file = st.selectbox("选择文件", result_files)
+                        st.download_button("📥 下载所选文件", partial(read_result_file, result_handle, selected_file),
+                                           Path(selected_file).name, use_container_width=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 测试从项目根目录导入common（与streamlit run app.py时一致）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,17 @@
+import pandas as pd
+
+from common.processors.excel_title import compact_dtypes
+
+
+def test_sparse_mostly_text_column_keeps_text():
+    values = [1, 2, "甲", "乙", "丙", "丁"] + [float("nan")] * 200
+    df = compact_dtypes(pd.DataFrame({"备注": values}))
+    assert df["备注"].dtype == object
+    assert df["备注"].dropna().tolist() == [1, 2, "甲", "乙", "丙", "丁"]
+
+
+def test_mostly_numeric_column_drops_stray_text():
+    values = list(range(1, 40)) + ["无"] + [float("nan")] * 10
+    df = compact_dtypes(pd.DataFrame({"数量": values}))
+    assert str(df["数量"].dtype) == "Int8"
+    assert df["数量"].isna().sum() == 11
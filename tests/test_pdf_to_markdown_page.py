@@ -0,0 +1,33 @@
+from pathlib import Path
+from unittest import mock
+
+from streamlit.testing.v1 import AppTest
+
+import common.result_store as result_store
+
+PAGE = str(Path(__file__).resolve().parent.parent / "pages" / "pdf_tools" / "pdf_to_markdown.py")
+
+
+class FakeUpload:
+    name = "报告.pdf"
+    file_id = "fake-upload"
+    size = 4
+    
+    def getvalue(self):
+        return b"%PDF"
+
+
+def test_results_section_renders_downloads(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "RESULT_DIR", tmp_path)
+    with result_store.ResultWriter() as writer:
+        writer.writestr("报告.md", "# 标题")
+        writer.writestr("附录.md", "内容")
+    handle = result_store.save_result(writer)
+    
+    with mock.patch("common.archive_input.expand_uploads", return_value=[FakeUpload()]):
+        at = AppTest.from_file(PAGE, default_timeout=30)
+        at.session_state.pdf_md_result = (handle, [["报告.pdf", "✅ 转换成功"]])
+        at.run()
+    
+    assert not at.exception
+    assert [button.label for button in at.get("download_button")] == ["📥 下载转换文件", "📥 下载所选文件"]
@@ -0,0 +1,50 @@
+"""独立处理进程：从共享的SQLite任务存储中领取页面和HTTP接口提交的任务，与页面服务分开运行和限制资源
+
+用法示例：
+    CDL_TASK_STORE=sqlite CDL_EMBEDDED_WORKERS=0 streamlit run app.py   # 页面进程只提交任务
+    CDL_TASK_STORE=sqlite python worker.py                              # 可同时运行多个
+    CDL_TASK_STORE=sqlite python worker.py --queues lo --workers 2
+"""
+import os
+import sys
+import time
+import argparse
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="数据预处理工具集 - 独立处理进程")
+    parser.add_argument("--queues", default="fp,lo", help="处理的队列，逗号分隔：fp（文件处理）、lo（LibreOffice转换）")
+    parser.add_argument("--workers", type=int, default=0, help="进程池进程数，默认使用全部CPU核心")
+    args = parser.parse_args(argv)
+    if args.workers > 0:
+        # 进程池在首次导入时读取进程数，需在导入前设置
+        os.environ["CDL_PROCESS_WORKERS"] = str(args.workers)
+    # 只为指定的队列启动工作线程
+    os.environ["CDL_EMBEDDED_WORKERS"] = "0"
+    
+    from common.task_store import TASK_DIR, TASK_STORE
+    if TASK_STORE != "sqlite":
+        print("独立处理进程需与页面共用任务存储，请设置 CDL_TASK_STORE=sqlite 和相同的 CDL_TASK_DIR", file=sys.stderr)
+        return 2
+    
+    from common.file_processing_queue import fp_queue
+    from common.libreoffice_queue import lo_queue
+    queues = {queue.queue_name: queue for queue in (fp_queue, lo_queue)}
+    names = [name.strip() for name in args.queues.split(",") if name.strip()]
+    unknown = [name for name in names if name not in queues]
+    if unknown or not names:
+        print(f"未知队列: {', '.join(unknown)}，可选 {', '.join(queues)}", file=sys.stderr)
+        return 2
+    
+    for name in names:
+        queues[name].start_worker()
+    print(f"处理进程已启动：队列 {', '.join(names)}，任务目录 {TASK_DIR}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())